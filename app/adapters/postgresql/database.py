@@ -0,0 +1,156 @@
+import asyncio
+import itertools
+import logging
+import time
+import uuid
+from collections.abc import AsyncIterator
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool, QueuePool
+
+from app import metrics
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Реплика, догнавшая мастер по WAL, считается без отставания даже если на мастере давно не было записей
+REPLICA_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """
+)
+
+
+class Database:
+    """Движок и фабрика сессий с настраиваемым пулом соединений.
+
+    В режиме pgbouncer (transaction pooling) отключаются кэши подготовленных
+    выражений SQLAlchemy и asyncpg и параметры соединения, которые pgbouncer не пропускает;
+    statement_timeout в этом случае задается на роли в самой базе.
+
+    ``direct_engine`` - соединения в обход pgbouncer для advisory lock-ов и LISTEN,
+    которым нужна одна и та же серверная сессия; без ``direct_dsn`` это основной движок.
+    """
+
+    def __init__(self, pg_dsn: str, name: str = "primary", direct_dsn: str | None = None) -> None:
+        self.name = name
+        self.engine = create_async_engine(
+            pg_dsn,
+            pool_size=settings.database_pool_size,
+            max_overflow=settings.database_max_overflow,
+            pool_timeout=settings.database_pool_timeout,
+            pool_pre_ping=settings.database_pool_pre_ping,
+            pool_recycle=settings.database_pool_recycle,
+            connect_args=self._connect_args(settings.database_pgbouncer),
+        )
+        self.session_factory = async_sessionmaker(self.engine, expire_on_commit=False)
+        # Таких соединений единицы и они долгоживущие, пул им не нужен
+        self.direct_engine = (
+            create_async_engine(direct_dsn, poolclass=NullPool, connect_args=self._connect_args(pgbouncer=False))
+            if direct_dsn
+            else self.engine
+        )
+
+    @staticmethod
+    def _connect_args(pgbouncer: bool) -> dict[str, Any]:
+        if pgbouncer:
+            # Выражения готовит диалект SQLAlchemy со своим кэшем, кэш asyncpg он обходит - отключаем оба.
+            # Имена подготовленных выражений уникальны, иначе соседние клиенты pgbouncer их перепутают
+            return {
+                "prepared_statement_cache_size": 0,
+                "statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+            }
+        connect_args: dict[str, Any] = {"prepared_statement_cache_size": settings.database_statement_cache_size}
+        if settings.database_statement_timeout_ms:
+            connect_args["server_settings"] = {"statement_timeout": str(settings.database_statement_timeout_ms)}
+        return connect_args
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[AsyncSession]:
+        async with self.session_factory() as session:
+            # Берем соединение сразу, чтобы замерить ожидание пула отдельно от запросов
+            started = time.perf_counter()
+            await session.connection()
+            metrics.DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started, pool=self.name)
+            self._observe_pool()
+            yield session
+
+    def _observe_pool(self) -> None:
+        pool = self.engine.pool
+        if not isinstance(pool, QueuePool):
+            return
+        metrics.DB_POOL_CONNECTIONS.set(pool.checkedout(), pool=self.name, state="checked_out")
+        metrics.DB_POOL_CONNECTIONS.set(pool.checkedin(), pool=self.name, state="idle")
+        metrics.DB_POOL_CONNECTIONS.set(max(pool.overflow(), 0), pool=self.name, state="overflow")
+
+    async def close(self) -> None:
+        await self.engine.dispose()
+        if self.direct_engine is not self.engine:
+            await self.direct_engine.dispose()
+
+
+class ReadDatabase:
+    """Сессии только для чтения: реплики по кругу, с откатом на мастер.
+
+    Реплика используется, пока последняя проверка отставания уложилась в
+    ``database_replica_max_lag_seconds``. До первой проверки, при большом
+    отставании или ошибке подключения чтение идет в мастер.
+    """
+
+    def __init__(self, primary: Database, replica_dsns: list[str]) -> None:
+        self.primary = primary
+        self.replicas = [Database(dsn, name=f"replica{number}") for number, dsn in enumerate(replica_dsns)]
+        self.healthy = {replica.name: False for replica in self.replicas}
+        self.rotation = itertools.cycle(range(len(self.replicas))) if self.replicas else None
+        # Сколько реплика может не видеть записи мастера: лаг выше max_lag замечается не раньше следующей проверки
+        self.settle = (
+            settings.database_replica_max_lag_seconds + settings.database_replica_check_seconds if self.replicas else 0
+        )
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[AsyncSession]:
+        async with AsyncExitStack() as stack:
+            session = await self._enter_replica(stack)
+            if session is None:
+                session = await stack.enter_async_context(self.primary.session())
+            yield session
+
+    async def _enter_replica(self, stack: AsyncExitStack) -> AsyncSession | None:
+        if self.rotation is None:
+            return None
+        start = next(self.rotation)
+        for replica in self.replicas[start:] + self.replicas[:start]:
+            if not self.healthy[replica.name]:
+                continue
+            try:
+                return await stack.enter_async_context(replica.session())
+            except Exception:
+                logger.warning("Replica %s is unavailable, falling back", replica.name, exc_info=True)
+                self.healthy[replica.name] = False
+        return None
+
+    async def monitor_lag(self) -> None:
+        while True:
+            for replica in self.replicas:
+                try:
+                    async with replica.engine.connect() as connection:
+                        lag = float(await connection.scalar(REPLICA_LAG_QUERY) or 0)
+                except Exception:
+                    logger.warning("Replica %s lag check failed", replica.name, exc_info=True)
+                    self.healthy[replica.name] = False
+                    continue
+                metrics.DB_REPLICA_LAG_SECONDS.set(lag, pool=replica.name)
+                self.healthy[replica.name] = lag <= settings.database_replica_max_lag_seconds
+
+            await asyncio.sleep(settings.database_replica_check_seconds)
+
+    async def close(self) -> None:
+        for replica in self.replicas:
+            await replica.close()
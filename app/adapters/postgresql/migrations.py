@@ -0,0 +1,65 @@
+import logging
+import zlib
+from pathlib import Path
+
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.adapters.postgresql.database import Database
+
+logger = logging.getLogger(__name__)
+
+ALEMBIC_INI = Path(__file__).resolve().parents[3] / "alembic.ini"
+MIGRATION_LOCK_KEY = zlib.crc32(b"brainsbot:migrations")
+
+
+async def current_revisions(connection: AsyncConnection) -> set[str]:
+    try:
+        result = await connection.execute(text("SELECT version_num FROM alembic_version"))
+    except ProgrammingError:
+        # Пустая база - таблицы версий еще нет
+        return set()
+    return set(result.scalars())
+
+
+async def migrate_to_head(database: Database) -> None:
+    """Накатывает миграции в процессе бота, если схема отстает от head.
+
+    Обычный рестарт обходится одним запросом к alembic_version вместо отдельного
+    процесса ``alembic upgrade head``. Реплики, стартующие одновременно, накатывают
+    миграции по очереди под advisory lock.
+    """
+    config = Config(str(ALEMBIC_INI))
+    heads = set(ScriptDirectory.from_config(config).get_heads())
+
+    # Advisory lock привязан к серверной сессии - только прямое соединение, мимо pgbouncer
+    async with database.direct_engine.connect() as connection:
+        await connection.execution_options(isolation_level="AUTOCOMMIT")
+        if await current_revisions(connection) == heads:
+            logger.info("Database schema is at head %s", ", ".join(sorted(heads)))
+            return
+
+        await connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            # Пока ждали блокировку, миграции могла накатить другая реплика
+            if await current_revisions(connection) != heads:
+                logger.info("Upgrading database schema to %s", ", ".join(sorted(heads)))
+                async with database.direct_engine.begin() as upgrade_connection:
+                    # Перестройка больших таблиц не должна упираться в statement_timeout бота
+                    await upgrade_connection.execute(text("SET LOCAL statement_timeout = 0"))
+                    await upgrade_connection.run_sync(_upgrade, config)
+        finally:
+            await connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+
+def _upgrade(connection: Connection, config: Config) -> None:
+    # Ленивый импорт: команды alembic нужны только при реальном обновлении схемы
+    from alembic import command
+
+    # env.py возьмет это соединение вместо собственного движка и не тронет настройки логирования
+    config.attributes["connection"] = connection
+    command.upgrade(config, "head")
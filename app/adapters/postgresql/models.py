@@ -1,15 +1,31 @@
-from datetime import datetime
+from datetime import date, datetime
 
-from sqlalchemy import BigInteger, Boolean, DateTime, ForeignKey, Integer, String
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    UniqueConstraint,
+    text,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from vi_core.sqlalchemy.base_model import Base, TimestampMixin
 
-from app.entities import AMOUNT
+from app.entities import AMOUNT, OutboxAction, PaymentCheckStatus
 from app.settings import settings
 
 
 class Subscription(Base, TimestampMixin):
     __tablename__ = "subscriptions"
+    __table_args__ = (
+        # Диапазонные выборки ближайших истечений по активным подпискам
+        Index("ix_subscriptions_active_end_date", "end_date", postgresql_where=text("is_active")),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id"), nullable=False, unique=True)
@@ -23,6 +39,20 @@ class Subscription(Base, TimestampMixin):
 
 class User(Base, TimestampMixin):
     __tablename__ = "users"
+    __table_args__ = (
+        # Триграммный поиск администратора по подстроке username и имени
+        Index(
+            "ix_users_username_trgm", "username", postgresql_using="gin", postgresql_ops={"username": "gin_trgm_ops"}
+        ),
+        Index(
+            "ix_users_first_name_trgm",
+            "first_name",
+            postgresql_using="gin",
+            postgresql_ops={"first_name": "gin_trgm_ops"},
+        ),
+        # Рассылки по языку
+        Index("ix_users_language_code", "language_code"),
+    )
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     first_name: Mapped[str] = mapped_column(String(255), nullable=False)
@@ -42,6 +72,10 @@ class User(Base, TimestampMixin):
 
 class Referral(Base, TimestampMixin):
     __tablename__ = "referrals"
+    __table_args__ = (
+        # Обход дерева рефералов сверху вниз
+        Index("ix_referrals_referrer_id", "referrer_id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     # Пользователь, которого пригласили
@@ -55,3 +89,95 @@ class Referral(Base, TimestampMixin):
         "User", foreign_keys=[referrer_id], back_populates="referrals", uselist=False
     )
 
+
+class SentReminder(Base, TimestampMixin):
+    __tablename__ = "sent_reminders"
+    # Одно напоминание на пользователя, окно и конкретную дату окончания подписки
+    __table_args__ = (UniqueConstraint("user_id", "days_before", "end_date"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id"), nullable=False)
+    days_before: Mapped[int] = mapped_column(Integer, nullable=False)
+    end_date: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+class PaymentCheck(Base, TimestampMixin):
+    __tablename__ = "payment_checks"
+    __table_args__ = (
+        # Очередь чеков, которые воркер еще не переслал администратору
+        Index("ix_payment_checks_not_forwarded", "id", postgresql_where=text("forwarded_at IS NULL")),
+        Index("ix_payment_checks_pending", "id", postgresql_where=text("status = 'pending'")),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id"), nullable=False)
+    username: Mapped[str] = mapped_column(String(255), nullable=False)
+    # file_id фото или документа в Telegram
+    file_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    file_type: Mapped[str] = mapped_column(String(16), nullable=False)
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default=PaymentCheckStatus.PENDING)
+    forwarded_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+
+class OutboxMessage(Base, TimestampMixin):
+    __tablename__ = "xui_outbox"
+    __table_args__ = (
+        # Выборка недоставленных сообщений, чей срок повтора наступил
+        Index("ix_xui_outbox_pending", "next_attempt_at", postgresql_where=text("delivered_at IS NULL")),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    idempotency_key: Mapped[str] = mapped_column(String(255), nullable=False, unique=True)
+    action: Mapped[str] = mapped_column(String(32), nullable=False, default=OutboxAction.UPSERT_CLIENT)
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id"), nullable=False)
+    end_date: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    last_error: Mapped[str] = mapped_column(Text, nullable=True)
+    delivered_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+
+class ClientPlacement(Base, TimestampMixin):
+    __tablename__ = "client_placements"
+
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id"), primary_key=True)
+    # Имя сервера из settings.xui_pool
+    server: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+
+
+class TrafficSample(Base):
+    __tablename__ = "traffic_samples"
+    __table_args__ = (Index("ix_traffic_samples_user_id_sampled_at", "user_id", "sampled_at"),)
+
+    # Временной ряд без внешнего ключа: на панели бывают клиенты, заведенные вручную
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    server: Mapped[str] = mapped_column(String(64), nullable=False)
+    up: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    down: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    sampled_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+
+
+class TrafficLatest(Base):
+    __tablename__ = "traffic_latest"
+
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    server: Mapped[str] = mapped_column(String(64), nullable=False)
+    up: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    down: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    sampled_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+class StatsCounter(Base):
+    __tablename__ = "stats_counters"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    value: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
+class DailySignups(Base):
+    __tablename__ = "stats_daily_signups"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
@@ -70,6 +70,59 @@ def referral_to_model(referral: entities.Referral) -> models.Referral:
     )
 
 
+def payment_check_to_entity(payment_check: models.PaymentCheck) -> entities.PaymentCheck:
+    return entities.PaymentCheck(
+        id=payment_check.id,
+        user_id=payment_check.user_id,
+        username=payment_check.username,
+        file_id=payment_check.file_id,
+        file_type=entities.PaymentCheckFileType(payment_check.file_type),
+        text=payment_check.text,
+        status=entities.PaymentCheckStatus(payment_check.status),
+        forwarded_at=payment_check.forwarded_at,
+        created_at=payment_check.created_at,
+        updated_at=payment_check.updated_at,
+    )
+
+
+def payment_check_to_model(payment_check: entities.PaymentCheck) -> models.PaymentCheck:
+    return models.PaymentCheck(
+        id=payment_check.id if payment_check.id else None,
+        user_id=payment_check.user_id,
+        username=payment_check.username,
+        file_id=payment_check.file_id,
+        file_type=payment_check.file_type,
+        text=payment_check.text,
+        status=payment_check.status,
+        forwarded_at=payment_check.forwarded_at,
+    )
+
+
+def outbox_message_to_entity(outbox_message: models.OutboxMessage) -> entities.OutboxMessage:
+    return entities.OutboxMessage(
+        id=outbox_message.id,
+        idempotency_key=outbox_message.idempotency_key,
+        action=entities.OutboxAction(outbox_message.action),
+        user_id=outbox_message.user_id,
+        end_date=outbox_message.end_date,
+        attempts=outbox_message.attempts,
+        next_attempt_at=outbox_message.next_attempt_at,
+        last_error=outbox_message.last_error,
+        delivered_at=outbox_message.delivered_at,
+        created_at=outbox_message.created_at,
+        updated_at=outbox_message.updated_at,
+    )
+
+
+def traffic_latest_to_entity(traffic_latest: models.TrafficLatest) -> entities.TrafficUsage:
+    return entities.TrafficUsage(
+        user_id=traffic_latest.user_id,
+        server=traffic_latest.server,
+        up=traffic_latest.up,
+        down=traffic_latest.down,
+        sampled_at=traffic_latest.sampled_at,
+    )
+
 
 mapper.register(models.Referral, entities.Referral, referral_to_entity, True)
 mapper.register(entities.Referral, models.Referral, referral_to_model)
@@ -77,3 +130,7 @@ mapper.register(models.User, entities.User, user_to_entity, True)
 mapper.register(entities.User, models.User, user_to_model)
 mapper.register(models.Subscription, entities.Subscription, subscription_to_entity, True)
 mapper.register(entities.Subscription, models.Subscription, subscription_to_model)
+mapper.register(models.PaymentCheck, entities.PaymentCheck, payment_check_to_entity, True)
+mapper.register(entities.PaymentCheck, models.PaymentCheck, payment_check_to_model)
+mapper.register(models.OutboxMessage, entities.OutboxMessage, outbox_message_to_entity, True)
+mapper.register(models.TrafficLatest, entities.TrafficUsage, traffic_latest_to_entity, True)
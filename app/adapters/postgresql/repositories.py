@@ -1,23 +1,126 @@
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from typing import Any
 
-from sqlalchemy import func, select
+from sqlalchemy import (
+    ARRAY,
+    BigInteger,
+    ColumnElement,
+    DateTime,
+    Integer,
+    Subquery,
+    Text,
+    any_,
+    cast,
+    column,
+    delete,
+    distinct,
+    func,
+    literal,
+    or_,
+    select,
+    text,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import array, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from vi_core.sqlalchemy import SessionHelper
 
-from app import entities
+from app import entities, metrics, tracing
 from app.adapters.postgresql import models
 from app.adapters.postgresql.registry import mapper
 
 
+def _audience_condition(audience: entities.Audience, now: datetime) -> ColumnElement[bool] | None:
+    """Условие отбора пользователей сегмента; каждое опирается на индекс."""
+    subscription = select(models.Subscription.id).where(models.Subscription.user_id == models.User.id)
+    match audience.segment:
+        case entities.AudienceSegment.ACTIVE:
+            return subscription.where(models.Subscription.is_active == True).exists()
+        case entities.AudienceSegment.INACTIVE:
+            return subscription.where(models.Subscription.is_active == False).exists()
+        case entities.AudienceSegment.EXPIRING:
+            # Частичный индекс ix_subscriptions_active_end_date
+            return subscription.where(
+                models.Subscription.is_active == True,
+                models.Subscription.end_date <= now + timedelta(days=audience.days),
+            ).exists()
+        case entities.AudienceSegment.LANGUAGE:
+            return models.User.language_code == audience.language_code
+        case entities.AudienceSegment.REFERRERS:
+            # Индекс ix_referrals_referrer_id
+            return select(models.Referral.id).where(models.Referral.referrer_id == models.User.id).exists()
+    return None
+
+
+@tracing.traced
+@metrics.instrumented(metrics.DB_QUERY_SECONDS)
 class UserRepository:
     def __init__(self, session: AsyncSession):
+        self.session = session
         self.helper = SessionHelper[models.User](session)
 
     async def add_one(self, new_user: entities.User) -> None:
         await self.helper.save(mapper.map(new_user, models.User))
 
+    async def register(
+        self, new_user: entities.User, new_subscription: entities.Subscription, referrer_id: int | None
+    ) -> tuple[bool, bool]:
+        """Создает пользователя, подписку и реферальную связь одним запросом.
+
+        Возвращает, создан ли пользователь и добавлена ли реферальная связь. Если пользователь
+        уже существует, ничего не меняется. Связь не добавляется, если реферера нет в базе.
+        """
+        inserted_user = (
+            insert(models.User)
+            .values(
+                id=new_user.id,
+                first_name=new_user.first_name,
+                last_name=new_user.last_name,
+                username=new_user.username,
+                language_code=new_user.language_code,
+            )
+            .on_conflict_do_nothing(index_elements=["id"])
+            .returning(models.User.id)
+            .cte("inserted_user")
+        )
+        inserted_subscription = (
+            insert(models.Subscription)
+            .from_select(
+                ["user_id", "is_notify", "is_active", "amount", "end_date"],
+                select(
+                    inserted_user.c.id,
+                    literal(new_subscription.is_notify),
+                    literal(new_subscription.is_active),
+                    literal(new_subscription.amount),
+                    literal(new_subscription.end_date, DateTime),
+                ),
+            )
+            .on_conflict_do_nothing(index_elements=["user_id"])
+            .cte("inserted_subscription")
+        )
+        stmt = select(inserted_user.c.id).add_cte(inserted_subscription)
+        if referrer_id is not None and referrer_id != new_user.id:
+            referrer_exists = select(models.User.id).where(models.User.id == referrer_id).exists()
+            inserted_referral = (
+                insert(models.Referral)
+                .from_select(
+                    ["referrer_id", "referral_id"],
+                    select(literal(referrer_id, BigInteger), inserted_user.c.id).where(referrer_exists),
+                )
+                .returning(models.Referral.referral_id)
+                .cte("inserted_referral")
+            )
+            stmt = stmt.add_columns(select(inserted_referral.c.referral_id).scalar_subquery())
+        else:
+            stmt = stmt.add_columns(literal(None, BigInteger))
+
+        row = (await self.session.execute(stmt)).first()
+        if row is None:
+            return False, False
+        return True, row[1] is not None
+
     async def find_one(self, **kwargs: Any) -> entities.User | None:
         stmt = (
             select(models.User)
@@ -32,18 +135,141 @@ class UserRepository:
         instances = await self.helper.all(stmt)
         return [mapper.map(instance, entities.User) for instance in instances]
 
+    async def count_audience(self, audience: entities.Audience, now: datetime) -> int:
+        stmt = select(func.count()).select_from(models.User)
+        condition = _audience_condition(audience, now)
+        if condition is not None:
+            stmt = stmt.where(condition)
+        return await self.session.scalar(stmt) or 0
+
+    async def find_audience_ids(
+        self, audience: entities.Audience, now: datetime, after_id: int | None, limit: int
+    ) -> list[int]:
+        """Очередная страница получателей по возрастанию id (keyset по первичному ключу)."""
+        stmt = select(models.User.id).order_by(models.User.id).limit(limit)
+        condition = _audience_condition(audience, now)
+        if condition is not None:
+            stmt = stmt.where(condition)
+        if after_id is not None:
+            stmt = stmt.where(models.User.id > after_id)
+        result = await self.session.execute(stmt)
+        return list(result.scalars())
+
+    async def search(self, query: str, limit: int, offset: int) -> list[entities.User]:
+        """Поиск по подстроке username или имени, самые похожие - первыми.
+
+        ILIKE обслуживают триграммные GIN-индексы ix_users_*_trgm; числовой запрос
+        дополнительно ищется как id.
+        """
+        conditions = [
+            models.User.username.icontains(query, autoescape=True),
+            models.User.first_name.icontains(query, autoescape=True),
+        ]
+        if query.isdigit():
+            conditions.append(models.User.id == int(query))
+        similarity = func.greatest(
+            func.similarity(models.User.username, query), func.similarity(models.User.first_name, query)
+        )
+        stmt = (
+            select(models.User)
+            .where(or_(*conditions))
+            .order_by(similarity.desc(), models.User.id)
+            .limit(limit)
+            .offset(offset)
+            .options(selectinload(models.User.subscription))
+        )
+        instances = await self.helper.all(stmt)
+        return [mapper.map(instance, entities.User) for instance in instances]
+
 
+@tracing.traced
+@metrics.instrumented(metrics.DB_QUERY_SECONDS)
 class SubscriptionRepository:
     def __init__(self, session: AsyncSession):
+        self.session = session
         self.helper = SessionHelper[models.Subscription](session)
 
-    async def find_all_expired(self) -> list[entities.Subscription]:
-        stmt = select(models.Subscription).filter(
-            models.Subscription.end_date < datetime.now(),
+    async def find_expiring(self, until: datetime) -> list[entities.Subscription]:
+        # Использует частичный индекс ix_subscriptions_active_end_date
+        stmt = (
+            select(models.Subscription)
+            .filter(models.Subscription.is_active == True, models.Subscription.end_date <= until)
+            .order_by(models.Subscription.end_date)
         )
         instances = await self.helper.all(stmt)
         return [mapper.map(instance, entities.Subscription) for instance in instances]
 
+    async def deactivate_expired(self, user_ids: list[int], now: datetime) -> dict[int, int]:
+        """Деактивирует истекшие подписки и возвращает их суммы по пользователям."""
+        stmt = (
+            update(models.Subscription)
+            .where(
+                models.Subscription.user_id.in_(user_ids),
+                models.Subscription.is_active == True,
+                models.Subscription.end_date <= now,
+            )
+            .values(is_active=False)
+            .returning(models.Subscription.user_id, models.Subscription.amount)
+        )
+        result = await self.session.execute(stmt)
+        return {user_id: amount for user_id, amount in result}
+
+    async def find_inactive_amounts(self, user_ids: list[int]) -> dict[int, int]:
+        stmt = select(models.Subscription.user_id, models.Subscription.amount).where(
+            models.Subscription.user_id.in_(user_ids), models.Subscription.is_active == False
+        )
+        result = await self.session.execute(stmt)
+        return {user_id: amount for user_id, amount in result}
+
+    async def extend(self, days_by_user: dict[int, int], now: datetime) -> dict[int, datetime]:
+        """Продлевает подписки одним запросом и возвращает новые даты окончания."""
+        if not days_by_user:
+            return {}
+        extensions = values(column("user_id", BigInteger), column("days", Integer), name="extensions").data(
+            list(days_by_user.items())
+        )
+        stmt = (
+            update(models.Subscription)
+            .where(models.Subscription.user_id == extensions.c.user_id)
+            .values(
+                # Истекшая давно подписка продлевается от текущего момента, а не от старой даты окончания
+                end_date=func.greatest(func.coalesce(models.Subscription.end_date, now), now)
+                + func.make_interval(0, 0, 0, extensions.c.days),
+                is_active=True,
+                is_notify=True,
+            )
+            .returning(models.Subscription.user_id, models.Subscription.end_date)
+        )
+        result = await self.session.execute(stmt)
+        return {user_id: end_date for user_id, end_date in result}
+
+    async def find_states(self, after_user_id: int | None, limit: int) -> list[tuple[int, bool, bool, int]]:
+        stmt = (
+            select(
+                models.Subscription.user_id,
+                models.Subscription.is_active,
+                models.Subscription.is_notify,
+                models.Subscription.amount,
+            )
+            .order_by(models.Subscription.user_id)
+            .limit(limit)
+        )
+        if after_user_id is not None:
+            stmt = stmt.where(models.Subscription.user_id > after_user_id)
+        result = await self.session.execute(stmt)
+        return [tuple(row) for row in result]
+
+    async def toggle_notify(self, user_id: int) -> entities.Subscription | None:
+        """Переключает уведомления активной подписки одним запросом, без предварительного чтения."""
+        stmt = (
+            update(models.Subscription)
+            .where(models.Subscription.user_id == user_id, models.Subscription.is_active == True)
+            .values(is_notify=~models.Subscription.is_notify)
+            .returning(models.Subscription)
+        )
+        instance = await self.session.scalar(stmt)
+        return mapper.map(instance, entities.Subscription) if instance else None
+
     async def add_one(self, new_subscription: entities.Subscription) -> None:
         await self.helper.save(mapper.map(new_subscription, models.Subscription))
 
@@ -56,6 +282,8 @@ class SubscriptionRepository:
         await self.helper.update(mapper.map(subscription, models.Subscription))
 
 
+@tracing.traced
+@metrics.instrumented(metrics.DB_QUERY_SECONDS)
 class ReferralRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
@@ -75,15 +303,434 @@ class ReferralRepository:
         instances = await self.helper.all(stmt)
         return [mapper.map(instance, entities.Referral) for instance in instances]
 
-    async def count_all_active_referral(self, referrer_id: int) -> int:
+    async def find_tree(self, referrer_id: int, max_depth: int) -> entities.ReferralTree:
+        """Сводка по всем уровням рефералов одним рекурсивным запросом.
+
+        Путь от корня хранится в массиве: пользователь, который уже встречался на
+        пути, не раскрывается повторно, так что цикл в данных не зациклит обход.
+        """
+        tree = (
+            select(
+                models.Referral.referral_id.label("user_id"),
+                literal(1).label("depth"),
+                array([models.Referral.referrer_id, models.Referral.referral_id]).label("path"),
+            )
+            .where(models.Referral.referrer_id == referrer_id, models.Referral.referral_id != referrer_id)
+            .cte("referral_tree", recursive=True)
+        )
+        tree = tree.union_all(
+            select(
+                models.Referral.referral_id,
+                tree.c.depth + 1,
+                func.array_append(tree.c.path, models.Referral.referral_id),
+            )
+            .join(tree, models.Referral.referrer_id == tree.c.user_id)
+            .where(~(models.Referral.referral_id == any_(tree.c.path)), tree.c.depth < max_depth)
+        )
+        # Пользователь с несколькими реферерами встретится в дереве несколько раз
+        members = distinct(tree.c.user_id)
+        is_direct = tree.c.depth == 1
+        stmt = (
+            select(
+                func.count(members).filter(is_direct),
+                func.count(members).filter(is_direct, models.Subscription.is_active == True),
+                func.count(members),
+                func.count(members).filter(models.Subscription.is_active == True),
+                func.coalesce(func.max(tree.c.depth), 0),
+                func.array_agg(members),
+            )
+            .select_from(tree)
+            .outerjoin(models.Subscription, models.Subscription.user_id == tree.c.user_id)
+        )
+        direct, active_direct, descendants, active_descendants, depth, descendant_ids = (
+            await self.session.execute(stmt)
+        ).one()
+        return entities.ReferralTree(
+            referrer_id=referrer_id,
+            direct=direct,
+            active_direct=active_direct,
+            descendants=descendants,
+            active_descendants=active_descendants,
+            depth=depth,
+            descendant_ids=frozenset(descendant_ids or ()),
+        )
+
+
+@tracing.traced
+@metrics.instrumented(metrics.DB_QUERY_SECONDS)
+class ReminderRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.helper = SessionHelper[models.Subscription](session)
+
+    async def find_due(
+        self, days_before: int, window_start: datetime, window_end: datetime
+    ) -> list[entities.Subscription]:
+        already_sent = (
+            select(models.SentReminder.id)
+            .where(
+                models.SentReminder.user_id == models.Subscription.user_id,
+                models.SentReminder.days_before == days_before,
+                models.SentReminder.end_date == models.Subscription.end_date,
+            )
+            .exists()
+        )
+        stmt = select(models.Subscription).filter(
+            models.Subscription.is_active == True,
+            models.Subscription.is_notify == True,
+            models.Subscription.end_date > window_start,
+            models.Subscription.end_date <= window_end,
+            # Подписка, созданная уже внутри срока напоминания (новый пробный период), его не получает
+            models.Subscription.created_at < models.Subscription.end_date - func.make_interval(0, 0, 0, days_before),
+            ~already_sent,
+        )
+        instances = await self.helper.all(stmt)
+        return [mapper.map(instance, entities.Subscription) for instance in instances]
+
+    async def add_many(self, reminders: list[entities.SentReminder]) -> list[int]:
+        """Сохраняет напоминания и возвращает user_id тех, что еще не были отправлены."""
+        if not reminders:
+            return []
         stmt = (
-            select(func.count(models.Referral.id))
-            .select_from(models.Referral)
-            .join(models.User, models.Referral.referral_id == models.User.id)
-            .join(models.Subscription, models.User.id == models.Subscription.user_id)
-            .filter(models.Referral.referrer_id == referrer_id)
+            insert(models.SentReminder)
+            .on_conflict_do_nothing(index_elements=["user_id", "days_before", "end_date"])
+            .returning(models.SentReminder.user_id)
+        )
+        # Окно может содержать десятки тысяч подписок: executemany (insertmanyvalues) разбивает вставку
+        # на пачки, иначе один VALUES упирается в лимит 32767 параметров asyncpg
+        result = await self.session.execute(
+            stmt,
+            [
+                {"user_id": reminder.user_id, "days_before": reminder.days_before, "end_date": reminder.end_date}
+                for reminder in reminders
+            ],
+        )
+        return list(result.scalars())
+
+
+@tracing.traced
+@metrics.instrumented(metrics.DB_QUERY_SECONDS)
+class PaymentCheckRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.helper = SessionHelper[models.PaymentCheck](session)
+
+    async def add_one(self, new_payment_check: entities.PaymentCheck) -> None:
+        await self.helper.save(mapper.map(new_payment_check, models.PaymentCheck))
+
+    async def find_not_forwarded(self, limit: int) -> list[entities.PaymentCheck]:
+        stmt = (
+            select(models.PaymentCheck)
+            .filter(models.PaymentCheck.forwarded_at.is_(None))
+            .order_by(models.PaymentCheck.id)
+            .limit(limit)
+        )
+        instances = await self.helper.all(stmt)
+        return [mapper.map(instance, entities.PaymentCheck) for instance in instances]
+
+    async def mark_forwarded(self, check_id: int, now: datetime) -> None:
+        stmt = update(models.PaymentCheck).where(models.PaymentCheck.id == check_id).values(forwarded_at=now)
+        await self.session.execute(stmt)
+
+    async def find_pending(self, limit: int) -> list[entities.PaymentCheck]:
+        stmt = (
+            select(models.PaymentCheck)
+            .filter(models.PaymentCheck.status == entities.PaymentCheckStatus.PENDING)
+            .order_by(models.PaymentCheck.id)
+            .limit(limit)
+        )
+        instances = await self.helper.all(stmt)
+        return [mapper.map(instance, entities.PaymentCheck) for instance in instances]
+
+    async def resolve(
+        self,
+        status: entities.PaymentCheckStatus,
+        ids: list[int] | None = None,
+        up_to_id: int | None = None,
+    ) -> list[int]:
+        """Переводит чеки из pending в status и возвращает user_id обработанных чеков.
+
+        Уже обработанные чеки не затрагиваются, поэтому повторное нажатие кнопки безопасно.
+        """
+        stmt = update(models.PaymentCheck).where(models.PaymentCheck.status == entities.PaymentCheckStatus.PENDING)
+        if ids is not None:
+            stmt = stmt.where(models.PaymentCheck.id.in_(ids))
+        if up_to_id is not None:
+            stmt = stmt.where(models.PaymentCheck.id <= up_to_id)
+        result = await self.session.execute(stmt.values(status=status).returning(models.PaymentCheck.user_id))
+        return list(result.scalars())
+
+
+# Канал уведомлений об измененных на панели клиентах, payload - user_id
+CLIENT_CHANGED_CHANNEL = "xui_client_changed"
+
+
+@tracing.traced
+@metrics.instrumented(metrics.DB_QUERY_SECONDS)
+class OutboxRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.helper = SessionHelper[models.OutboxMessage](session)
+
+    async def add_many(self, outbox_messages: list[entities.OutboxMessage]) -> None:
+        if not outbox_messages:
+            return
+        stmt = (
+            insert(models.OutboxMessage)
+            .values(
+                [
+                    {
+                        "idempotency_key": outbox_message.idempotency_key,
+                        "action": outbox_message.action,
+                        "user_id": outbox_message.user_id,
+                        "end_date": outbox_message.end_date,
+                        "next_attempt_at": outbox_message.next_attempt_at,
+                    }
+                    for outbox_message in outbox_messages
+                ]
+            )
+            .on_conflict_do_nothing(index_elements=["idempotency_key"])
+        )
+        await self.session.execute(stmt)
+
+    async def claim_due(self, now: datetime, limit: int) -> list[entities.OutboxMessage]:
+        """Блокирует пачку сообщений к доставке; занятые другим релеем строки пропускаются."""
+        stmt = (
+            select(models.OutboxMessage)
+            .filter(models.OutboxMessage.delivered_at.is_(None), models.OutboxMessage.next_attempt_at <= now)
+            .order_by(models.OutboxMessage.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        instances = await self.helper.all(stmt)
+        return [mapper.map(instance, entities.OutboxMessage) for instance in instances]
+
+    async def mark_delivered(self, ids: list[int], now: datetime) -> None:
+        if not ids:
+            return
+        stmt = update(models.OutboxMessage).where(models.OutboxMessage.id.in_(ids)).values(delivered_at=now)
+        await self.session.execute(stmt)
+
+    async def schedule_retry(self, ids: list[int], next_attempt_at: datetime, error: str) -> None:
+        stmt = (
+            update(models.OutboxMessage)
+            .where(models.OutboxMessage.id.in_(ids))
+            .values(
+                attempts=models.OutboxMessage.attempts + 1,
+                next_attempt_at=next_attempt_at,
+                last_error=error,
+            )
+        )
+        await self.session.execute(stmt)
+
+    async def notify_changed(self, user_ids: list[int]) -> None:
+        """Уведомляет реплики об изменении клиентов; NOTIFY уходит при коммите транзакции."""
+        if not user_ids:
+            return
+        changed = func.unnest(literal(user_ids, ARRAY(BigInteger))).table_valued("user_id")
+        stmt = select(func.pg_notify(CLIENT_CHANGED_CHANNEL, cast(changed.c.user_id, Text))).select_from(changed)
+        await self.session.execute(stmt)
+
+    async def postpone(self, ids: list[int], next_attempt_at: datetime) -> None:
+        """Откладывает доставку, не считая попытку: панель недоступна, запрос не отправлялся."""
+        if not ids:
+            return
+        stmt = (
+            update(models.OutboxMessage).where(models.OutboxMessage.id.in_(ids)).values(next_attempt_at=next_attempt_at)
+        )
+        await self.session.execute(stmt)
+
+
+@tracing.traced
+@metrics.instrumented(metrics.DB_QUERY_SECONDS)
+class PlacementRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def find_server(self, user_id: int) -> str | None:
+        stmt = select(models.ClientPlacement.server).where(models.ClientPlacement.user_id == user_id)
+        return await self.session.scalar(stmt)
+
+    async def find_servers(self, user_ids: list[int]) -> dict[int, str]:
+        stmt = select(models.ClientPlacement.user_id, models.ClientPlacement.server).where(
+            models.ClientPlacement.user_id.in_(user_ids)
+        )
+        result = await self.session.execute(stmt)
+        return {user_id: server for user_id, server in result}
+
+    async def count_by_server(self) -> dict[str, int]:
+        stmt = select(models.ClientPlacement.server, func.count()).group_by(models.ClientPlacement.server)
+        result = await self.session.execute(stmt)
+        return {server: count for server, count in result}
+
+    async def add_many(self, servers: dict[int, str]) -> None:
+        if not servers:
+            return
+        stmt = (
+            insert(models.ClientPlacement)
+            .values([{"user_id": user_id, "server": server} for user_id, server in servers.items()])
+            .on_conflict_do_nothing(index_elements=["user_id"])
+        )
+        await self.session.execute(stmt)
+
+
+@tracing.traced
+@metrics.instrumented(metrics.DB_QUERY_SECONDS)
+class TrafficRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def add_samples(self, usages: list[entities.TrafficUsage]) -> None:
+        if not usages:
+            return
+        # Список параметров уходит через executemany (insertmanyvalues), без лимита параметров в одном запросе
+        await self.session.execute(insert(models.TrafficSample), [self._row(usage) for usage in usages])
+
+    async def upsert_latest(self, usages: list[entities.TrafficUsage]) -> None:
+        if not usages:
+            return
+        stmt = insert(models.TrafficLatest)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={
+                "server": stmt.excluded.server,
+                "up": stmt.excluded.up,
+                "down": stmt.excluded.down,
+                "sampled_at": stmt.excluded.sampled_at,
+            },
+        )
+        await self.session.execute(stmt, [self._row(usage) for usage in usages])
+
+    async def find_latest(self, user_id: int) -> entities.TrafficUsage | None:
+        instance = await self.session.get(models.TrafficLatest, user_id)
+        return mapper.map(instance, entities.TrafficUsage) if instance else None
+
+    async def delete_samples_before(self, cutoff: datetime) -> None:
+        stmt = delete(models.TrafficSample).where(models.TrafficSample.sampled_at < cutoff)
+        await self.session.execute(stmt)
+
+    @staticmethod
+    def _row(usage: entities.TrafficUsage) -> dict[str, Any]:
+        return {
+            "user_id": usage.user_id,
+            "server": usage.server,
+            "up": usage.up,
+            "down": usage.down,
+            "sampled_at": usage.sampled_at,
+        }
+
+
+def _subscription_price(*referrer_conditions: ColumnElement[bool]) -> tuple[Subquery, ColumnElement[Any]]:
+    """Подзапрос активных рефералов и цена подписки с реферальной скидкой - та же, что показывает DonateUsecase."""
+    active_referrals = (
+        select(models.Referral.referrer_id, func.count().label("active_referrals"))
+        .join(models.Subscription, models.Subscription.user_id == models.Referral.referral_id)
+        .where(models.Subscription.is_active == True, *referrer_conditions)
+        .group_by(models.Referral.referrer_id)
+        .subquery()
+    )
+    discount = entities.DISCOUNT * func.coalesce(active_referrals.c.active_referrals, 0) / 100.0
+    price = func.greatest(func.trunc(models.Subscription.amount * (1 - discount)), 0)
+    return active_referrals, price
+
+
+@tracing.traced
+@metrics.instrumented(metrics.DB_QUERY_SECONDS)
+class StatsRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def increment(self, deltas: dict[entities.StatsCounter, int]) -> None:
+        rows = [{"name": name, "value": delta} for name, delta in deltas.items() if delta]
+        if not rows:
+            return
+        stmt = insert(models.StatsCounter).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["name"], set_={"value": models.StatsCounter.value + stmt.excluded.value}
+        )
+        await self.session.execute(stmt)
+
+    async def add_signup(self, day: date) -> None:
+        stmt = insert(models.DailySignups).values(day=day, count=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["day"], set_={"count": models.DailySignups.count + stmt.excluded.count}
+        )
+        await self.session.execute(stmt)
+
+    async def find_counters(self) -> dict[str, int]:
+        result = await self.session.execute(select(models.StatsCounter.name, models.StatsCounter.value))
+        return {name: value for name, value in result}
+
+    async def find_signups(self, since: date) -> list[tuple[date, int]]:
+        stmt = (
+            select(models.DailySignups.day, models.DailySignups.count)
+            .where(models.DailySignups.day >= since)
+            .order_by(models.DailySignups.day.desc())
+        )
+        result = await self.session.execute(stmt)
+        return [(day, count) for day, count in result]
+
+    async def increment_signups(self, deltas: dict[date, int]) -> None:
+        rows = [{"day": day, "count": delta} for day, delta in deltas.items() if delta]
+        if not rows:
+            return
+        stmt = insert(models.DailySignups).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["day"], set_={"count": models.DailySignups.count + stmt.excluded.count}
+        )
+        await self.session.execute(stmt)
+
+    async def revenue(self, user_ids: list[int]) -> int:
+        """Вклад в MONTHLY_REVENUE подписок пользователей и их рефереров - тех, чьи цены меняет их активность.
+
+        Разница значений до и после изменения подписок дает точный инкремент счетчика.
+        """
+        referrer_ids = select(models.Referral.referrer_id).where(models.Referral.referral_id.in_(user_ids))
+        active_referrals, price = _subscription_price(
+            or_(models.Referral.referrer_id.in_(user_ids), models.Referral.referrer_id.in_(referrer_ids))
+        )
+        stmt = (
+            select(func.coalesce(func.sum(price), 0))
+            .select_from(models.Subscription)
+            .outerjoin(active_referrals, active_referrals.c.referrer_id == models.Subscription.user_id)
+            .where(
+                models.Subscription.is_active == True,
+                or_(models.Subscription.user_id.in_(user_ids), models.Subscription.user_id.in_(referrer_ids)),
+            )
+        )
+        return int((await self.session.execute(stmt)).scalar_one())
+
+    async def snapshot(self) -> None:
+        """Все дальнейшие чтения транзакции видят один снимок базы; вызывать до первого запроса."""
+        await self.session.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"))
+
+    async def compute(self) -> tuple[dict[str, int], list[tuple[date, int]]]:
+        """Полный пересчет агрегатов по исходным таблицам; тяжелый, запускать на реплике."""
+        active_referrals, price = _subscription_price()
+        revenue = (
+            select(func.coalesce(func.sum(price), 0))
+            .select_from(models.Subscription)
+            .outerjoin(active_referrals, active_referrals.c.referrer_id == models.Subscription.user_id)
             .where(models.Subscription.is_active == True)
         )
-        result = await self.session.scalar(stmt)
-        return result or 0
+        stmt = select(
+            select(func.count()).select_from(models.User).scalar_subquery(),
+            select(func.count()).where(models.Subscription.is_active == True).scalar_subquery(),
+            select(func.count()).select_from(models.Referral).scalar_subquery(),
+            select(func.count())
+            .where(models.PaymentCheck.status == entities.PaymentCheckStatus.APPROVED)
+            .scalar_subquery(),
+            revenue.scalar_subquery(),
+        )
+        users, active, referrals, payments, monthly_revenue = (await self.session.execute(stmt)).one()
+        counters = {
+            entities.StatsCounter.USERS: users,
+            entities.StatsCounter.ACTIVE_SUBSCRIPTIONS: active,
+            entities.StatsCounter.REFERRALS: referrals,
+            entities.StatsCounter.PAYMENTS_APPROVED: payments,
+            entities.StatsCounter.MONTHLY_REVENUE: int(monthly_revenue),
+        }
 
+        day = func.date(models.User.created_at)
+        result = await self.session.execute(select(day, func.count()).group_by(day))
+        return counters, [(signup_day, count) for signup_day, count in result]
@@ -0,0 +1,9 @@
+from vi_core.sqlalchemy import UnitOfWork as BaseUnitOfWork
+
+from app import metrics, tracing
+
+
+@tracing.traced
+@metrics.instrumented(metrics.DB_QUERY_SECONDS)
+class UnitOfWork(BaseUnitOfWork):
+    pass
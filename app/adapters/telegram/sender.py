@@ -0,0 +1,44 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitedSender:
+    """Равномерно распределяет массовые отправки, чтобы не упираться в лимиты Bot API."""
+
+    def __init__(self, bot: Bot, messages_per_second: float) -> None:
+        self.bot = bot
+        self.interval = 1 / messages_per_second
+        self.next_at = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            delay = self.next_at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.next_at = max(loop.time(), self.next_at) + self.interval
+
+    async def send_message(self, chat_id: int, text: str, **kwargs: Any) -> bool:
+        return await self._send(chat_id, self.bot.send_message, chat_id, text, **kwargs)
+
+    async def copy_message(self, chat_id: int, from_chat_id: int, message_id: int, **kwargs: Any) -> bool:
+        """Копирует сообщение любого типа (текст, медиа, стикер) вместе с форматированием."""
+        return await self._send(chat_id, self.bot.copy_message, chat_id, from_chat_id, message_id, **kwargs)
+
+    async def _send(self, chat_id: int, method: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> bool:
+        await self.acquire()
+        try:
+            await method(*args, **kwargs)
+        except TelegramForbiddenError:
+            # Пользователь заблокировал бота - пропускаем
+            logger.info("User %s has blocked the bot", chat_id)
+            return False
+        return True
@@ -0,0 +1,66 @@
+import time
+from enum import IntEnum
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitState(IntEnum):
+    CLOSED = 0
+    HALF_OPEN = 1
+    OPEN = 2
+
+
+class CircuitBreaker:
+    """Размыкается после ``failure_threshold`` сбоев подряд и отклоняет вызовы без ожидания.
+
+    Через ``reset_timeout`` пропускает один пробный вызов: успех замыкает цепь,
+    сбой снова размыкает ее на ``reset_timeout``.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probing = False
+
+    @property
+    def state(self) -> CircuitState:
+        if self.opened_at is None:
+            return CircuitState.CLOSED
+        if self.probing or time.monotonic() - self.opened_at >= self.reset_timeout:
+            return CircuitState.HALF_OPEN
+        return CircuitState.OPEN
+
+    @property
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0
+        return max(self.opened_at + self.reset_timeout - time.monotonic(), 0)
+
+    def check(self) -> bool:
+        """Пропускает вызов или бросает CircuitOpenError; возвращает True для пробного вызова."""
+        state = self.state
+        if state == CircuitState.CLOSED:
+            return False
+        if state == CircuitState.HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        raise CircuitOpenError(f"Circuit is open, retry in {self.retry_after:.0f}s")
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+    def release(self) -> None:
+        # Пробный вызов прерван без результата - следующий вызов станет пробным
+        self.probing = False
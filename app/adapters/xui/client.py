@@ -1,72 +1,129 @@
+import asyncio
 import json
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime
+from typing import Any
 
-from vi_core import HttpClient
+import aiohttp
 
-from app.settings import settings
+from app import entities, metrics, tracing
+from app.adapters.xui.breaker import CircuitBreaker
+from app.settings import XuiServer, settings
 
 
+class XuiError(Exception):
+    pass
+
+
+@tracing.traced
+@metrics.instrumented(metrics.XUI_REQUEST_SECONDS)
 class XuiClient:
 
-    def __init__(self, base_url: str):
-        self.http_client = HttpClient(base_url=base_url)
+    def __init__(self, server: XuiServer):
+        self.server = server
+        # Сессия своя у клиента и закрывается при остановке бота; создается лениво, внутри event loop
+        self.http_session: aiohttp.ClientSession | None = None
+        self.logged_in = False
+        self.login_lock = asyncio.Lock()
+        # Медленная панель занимает не больше xui_max_concurrency запросов, остальные ждут или отклоняются
+        self.semaphore = asyncio.Semaphore(settings.xui_max_concurrency)
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.xui_failure_threshold,
+            reset_timeout=settings.xui_reset_timeout_seconds,
+        )
 
     async def login(self):
         url = "/login"
-        response = await self.http_client.request(
-            "POST", url, json={"username": settings.xui_username, "password": settings.xui_password}
-        )
-        return response.json()
-
-    async def add_client(
-        self,
-        email: str,
-        user_uuid: str,
-        days: int = 30,
-    ) -> None:
-        await self.login()
+        credentials = {"username": self.server.username, "password": self.server.password}
+        result = await self._send("POST", url, json=credentials)
+        if not result.get("success"):
+            raise XuiError(result.get("msg") or "3x-ui login failed")
+        self.logged_in = True
+        return result
+
+    async def health_check(self) -> None:
+        """Проверяет панель повторным логином; заодно продлевает сессионную куку."""
+        self.logged_in = False
+        await self._ensure_login()
+
+    async def add_client(self, email: str, user_uuid: str, end_date: datetime) -> None:
+        await self._ensure_login()
         url = "/panel/api/inbounds/addClient"
+        await self._request(url, self._client_data(user_uuid, email, end_date))
 
-        expiry_datetime = datetime.now() + timedelta(days=days)
-        expiry_time = int(expiry_datetime.timestamp() * 1000)
-
-        client_settings = {
-            "clients": [
-                {
-                    "id": user_uuid,
-                    "flow": "xtls-rprx-vision",
-                    "email": email,
-                    "limitIp": 0,
-                    "totalGB": 0,
-                    "expiryTime": expiry_time,
-                    "enable": True,
-                    "tgId": "",
-                    "subId": user_uuid,
-                    "comment": "",
-                    "reset": 0
-                }
-            ]
-        }
-
-        data = {
-            "id": "4",
-            "settings": json.dumps(client_settings)
-        }
-
-        await self.http_client.request("POST", url, data=data)
-
-    async def update_client(
-        self,
-        user_uuid: str,
-        email: str,
-        days: int = 30,
-    ):
-        await self.login()
+    async def update_client(self, user_uuid: str, email: str, end_date: datetime) -> None:
+        await self._ensure_login()
         url = f"/panel/api/inbounds/updateClient/{user_uuid}"
-        expiry_datetime = datetime.now() + timedelta(days=days)
-        expiry_time = int(expiry_datetime.timestamp() * 1000)
-
+        await self._request(url, self._client_data(user_uuid, email, end_date))
+
+    async def upsert_client(self, user_uuid: str, email: str, end_date: datetime) -> None:
+        """Создает клиента или выставляет срок уже существующему; безопасно повторять."""
+        try:
+            await self.add_client(email=email, user_uuid=user_uuid, end_date=end_date)
+        except XuiError:
+            await self.update_client(user_uuid=user_uuid, email=email, end_date=end_date)
+
+    async def client_traffic(self) -> list[entities.TrafficUsage]:
+        """Счетчики трафика всех клиентов инбаунда одним запросом."""
+        await self._ensure_login()
+        url = f"/panel/api/inbounds/get/{self.server.inbound_id}"
+        result = await self._send("GET", url)
+        if not result.get("success"):
+            raise XuiError(result.get("msg") or f"3x-ui request to {url} failed")
+        sampled_at = datetime.now()
+        # email клиента - его user_id; клиентов, заведенных на панели вручную, пропускаем
+        return [
+            entities.TrafficUsage(
+                user_id=int(stats["email"]),
+                server=self.server.name,
+                up=stats.get("up") or 0,
+                down=stats.get("down") or 0,
+                sampled_at=sampled_at,
+            )
+            for stats in (result.get("obj") or {}).get("clientStats") or []
+            if str(stats.get("email", "")).isdigit()
+        ]
+
+    async def close(self) -> None:
+        if self.http_session:
+            await self.http_session.close()
+
+    async def _ensure_login(self) -> None:
+        # Сессионная кука живет в http-сессии, логинимся один раз на экземпляр
+        async with self.login_lock:
+            if not self.logged_in:
+                await self.login()
+
+    async def _request(self, url: str, data: dict[str, str]) -> None:
+        result = await self._send("POST", url, data=data)
+        if not result.get("success"):
+            raise XuiError(result.get("msg") or f"3x-ui request to {url} failed")
+
+    async def _send(self, method: str, url: str, **kwargs: Any) -> dict[str, Any]:
+        async with self.semaphore:
+            probe = self.breaker.check()
+            try:
+                async with asyncio.timeout(settings.xui_request_timeout_seconds):
+                    if self.http_session is None:
+                        # Панели часто доступны по IP - куки с таких хостов по умолчанию отбрасываются
+                        self.http_session = aiohttp.ClientSession(cookie_jar=aiohttp.CookieJar(unsafe=True))
+                    full_url = f"{self.server.url_panel.rstrip('/')}{url}"
+                    async with self.http_session.request(method, full_url, **kwargs) as response:
+                        result = await response.json(content_type=None)
+            except asyncio.CancelledError:
+                if probe:
+                    self.breaker.release()
+                raise
+            except Exception:
+                # Сессия могла протухнуть вместе с панелью - после восстановления логинимся заново
+                self.logged_in = False
+                self.breaker.record_failure()
+                raise
+        # Отказ в самом ответе (например, клиент уже существует) - панель жива
+        self.breaker.record_success()
+        return result
+
+    def _client_data(self, user_uuid: str, email: str, end_date: datetime) -> dict[str, str]:
         client_settings = {
             "clients": [
                 {
@@ -75,7 +132,7 @@ class XuiClient:
                     "email": email,
                     "limitIp": 0,
                     "totalGB": 0,
-                    "expiryTime": expiry_time,
+                    "expiryTime": int(end_date.timestamp() * 1000),
                     "enable": True,
                     "tgId": "",
                     "subId": user_uuid,
@@ -85,14 +142,11 @@ class XuiClient:
             ]
         }
 
-        data = {
-            "id": "4",
+        return {
+            "id": str(self.server.inbound_id),
             "settings": json.dumps(client_settings)
         }
 
-        response = await self.http_client.request("POST", url, data=data)
-        return response.json()
-
 # async def main():
 #     client = XuiClient(http_client=HttpClient(base_url="http://144.31.16.145:22313/ZhOpx1y2ei2ONT8rmM"))
 #     await client.login()
@@ -0,0 +1,57 @@
+import asyncio
+import logging
+
+from app import metrics
+from app.adapters.xui.breaker import CircuitState
+from app.adapters.xui.client import XuiClient, XuiError
+from app.settings import XuiServer, settings
+
+logger = logging.getLogger(__name__)
+
+
+class XuiPool:
+    """Панели и инбаунды из настроек; у каждой свой клиент с сессией и предохранителем."""
+
+    def __init__(self, servers: list[XuiServer]):
+        self.servers = {server.name: server for server in servers}
+        self.clients: dict[str, XuiClient] = {}
+
+    def client(self, name: str) -> XuiClient:
+        if name not in self.servers:
+            raise XuiError(f"Unknown 3x-ui server {name!r}")
+        if name not in self.clients:
+            self.clients[name] = XuiClient(self.servers[name])
+        return self.clients[name]
+
+    def available(self, name: str) -> bool:
+        return self.client(name).breaker.state != CircuitState.OPEN
+
+    def choose(self, counts: dict[str, int]) -> str:
+        """Выбирает сервер с наименьшим числом клиентов относительно его емкости.
+
+        Серверы с разомкнутым предохранителем пропускаются, пока есть другие.
+        """
+        candidates = [server for server in self.servers.values() if server.weight > 0]
+        if not candidates:
+            raise XuiError("No 3x-ui server accepts new clients")
+        candidates = [server for server in candidates if self.available(server.name)] or candidates
+        return min(candidates, key=lambda server: counts.get(server.name, 0) / server.weight).name
+
+    async def close(self) -> None:
+        for client in self.clients.values():
+            await client.close()
+
+    async def health_check(self) -> None:
+        for name in self.servers:
+            client = self.client(name)
+            try:
+                await client.health_check()
+            except Exception as error:
+                logger.warning("3x-ui server %s health check failed: %r", name, error)
+            metrics.XUI_CIRCUIT_STATE.set(client.breaker.state, server=name)
+
+
+async def xui_health_loop(xui_pool: XuiPool) -> None:
+    while True:
+        await xui_pool.health_check()
+        await asyncio.sleep(settings.xui_health_check_seconds)
@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import aiohttp
+
+from app.adapters.postgresql.database import ReadDatabase
+from app.adapters.postgresql.repositories import PlacementRepository
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Заголовки панели, которые читают клиентские приложения (трафик, срок, интервал обновления)
+FORWARDED_HEADERS = (
+    "Content-Type",
+    "Content-Disposition",
+    "Subscription-Userinfo",
+    "Profile-Update-Interval",
+    "Profile-Title",
+    "Support-Url",
+)
+
+
+@dataclass
+class CachedSubscription:
+    body: bytes
+    headers: dict[str, str]
+    etag: str
+    last_modified: datetime
+    fetched_at: float
+
+
+class SubscriptionCache:
+    """Содержимое подписок с панелей, закэшированное по пользователю.
+
+    Запись живет ``subscription_cache_ttl_seconds`` или до инвалидации после
+    изменения клиента на панели. Одновременные промахи по одному пользователю
+    делают один запрос к панели; если панель не ответила, отдается старая запись.
+    """
+
+    def __init__(self, database: ReadDatabase) -> None:
+        self.database = database
+        self.entries: OrderedDict[int, CachedSubscription] = OrderedDict()
+        self.pending: dict[int, asyncio.Task[CachedSubscription | None]] = {}
+        self.http_session: aiohttp.ClientSession | None = None
+
+    async def get(self, user_id: int) -> CachedSubscription | None:
+        entry = self.entries.get(user_id)
+        if entry and time.monotonic() - entry.fetched_at < settings.subscription_cache_ttl_seconds:
+            self.entries.move_to_end(user_id)
+            return entry
+
+        task = self.pending.get(user_id)
+        if task is None:
+            task = asyncio.create_task(self._refresh(user_id, entry))
+            self.pending[user_id] = task
+            task.add_done_callback(lambda done: self._forget(user_id, done))
+        # Отмена одного запроса клиента не должна обрывать загрузку для остальных
+        return await asyncio.shield(task)
+
+    def invalidate(self, user_id: int) -> None:
+        self.entries.pop(user_id, None)
+        # Загрузка, начатая до изменения, не попадет в кэш
+        self.pending.pop(user_id, None)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.pending.clear()
+
+    async def close(self) -> None:
+        if self.http_session:
+            await self.http_session.close()
+
+    def _forget(self, user_id: int, task: asyncio.Task[CachedSubscription | None]) -> None:
+        if self.pending.get(user_id) is task:
+            del self.pending[user_id]
+
+    async def _refresh(self, user_id: int, entry: CachedSubscription | None) -> CachedSubscription | None:
+        try:
+            fetched = await self._fetch(user_id)
+        except Exception:
+            logger.warning("Subscription fetch for user %s failed", user_id, exc_info=True)
+            return entry
+        if fetched is None:
+            self.invalidate(user_id)
+            return None
+
+        body, headers = fetched
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        # Last-Modified меняется, только если изменилось само содержимое
+        last_modified = entry.last_modified if entry and entry.etag == etag else datetime.now(timezone.utc)
+        refreshed = CachedSubscription(body, headers, etag, last_modified.replace(microsecond=0), time.monotonic())
+        if self.pending.get(user_id) is asyncio.current_task():
+            self.entries[user_id] = refreshed
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > settings.subscription_cache_size:
+                self.entries.popitem(last=False)
+        return refreshed
+
+    async def _fetch(self, user_id: int) -> tuple[bytes, dict[str, str]] | None:
+        async with self.database.session() as session:
+            server = settings.xui_server(await PlacementRepository(session=session).find_server(user_id))
+
+        if self.http_session is None:
+            timeout = aiohttp.ClientTimeout(total=settings.xui_request_timeout_seconds)
+            self.http_session = aiohttp.ClientSession(timeout=timeout)
+        async with self.http_session.get(f"{server.url_subscriptions}/{user_id}") as response:
+            if response.status == 404:
+                return None
+            response.raise_for_status()
+            body = await response.read()
+            headers = {name: response.headers[name] for name in FORWARDED_HEADERS if name in response.headers}
+        return body, headers
@@ -1,8 +1,10 @@
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
+from enum import StrEnum
 
 AMOUNT = 300
 DISCOUNT = 15
+TRIAL_DAYS = 3
 
 
 @dataclass
@@ -12,7 +14,7 @@ class Subscription:
     is_active: bool = True
     amount: int = AMOUNT
     id: int | None = None
-    end_date: datetime | None = field(default_factory=lambda: datetime.now() + timedelta(days=3))
+    end_date: datetime | None = field(default_factory=lambda: datetime.now() + timedelta(days=TRIAL_DAYS))
     created_at: datetime = field(default_factory=datetime.now)
     updated_at: datetime = field(default_factory=datetime.now)
 
@@ -38,3 +40,109 @@ class Referral:
     created_at: datetime = field(default_factory=datetime.now)
     updated_at: datetime = field(default_factory=datetime.now)
     referral: User | None = None
+
+
+@dataclass
+class ReferralTree:
+    """Сводка по всем уровням рефералов пользователя."""
+
+    referrer_id: int
+    direct: int = 0
+    active_direct: int = 0
+    descendants: int = 0
+    active_descendants: int = 0
+    depth: int = 0
+    descendant_ids: frozenset[int] = frozenset()
+
+
+@dataclass
+class SentReminder:
+    user_id: int
+    days_before: int
+    end_date: datetime
+    id: int | None = None
+    created_at: datetime = field(default_factory=datetime.now)
+    updated_at: datetime = field(default_factory=datetime.now)
+
+
+class PaymentCheckStatus(StrEnum):
+    PENDING = "pending"
+    APPROVED = "approved"
+    REJECTED = "rejected"
+
+
+class PaymentCheckFileType(StrEnum):
+    PHOTO = "photo"
+    DOCUMENT = "document"
+
+
+@dataclass
+class PaymentCheck:
+    user_id: int
+    username: str
+    file_id: str
+    file_type: PaymentCheckFileType
+    text: str
+    status: PaymentCheckStatus = PaymentCheckStatus.PENDING
+    forwarded_at: datetime | None = None
+    id: int | None = None
+    created_at: datetime = field(default_factory=datetime.now)
+    updated_at: datetime = field(default_factory=datetime.now)
+
+
+class OutboxAction(StrEnum):
+    UPSERT_CLIENT = "upsert_client"
+
+
+@dataclass
+class OutboxMessage:
+    idempotency_key: str
+    user_id: int
+    # Абсолютный срок, чтобы повторная доставка не продлевала подписку еще раз
+    end_date: datetime
+    action: OutboxAction = OutboxAction.UPSERT_CLIENT
+    attempts: int = 0
+    next_attempt_at: datetime = field(default_factory=datetime.now)
+    last_error: str | None = None
+    delivered_at: datetime | None = None
+    id: int | None = None
+    created_at: datetime = field(default_factory=datetime.now)
+    updated_at: datetime = field(default_factory=datetime.now)
+
+
+@dataclass
+class TrafficUsage:
+    """Накопленные счетчики трафика клиента на панели, в байтах."""
+
+    user_id: int
+    server: str
+    up: int
+    down: int
+    sampled_at: datetime = field(default_factory=datetime.now)
+
+
+class StatsCounter(StrEnum):
+    USERS = "users"
+    ACTIVE_SUBSCRIPTIONS = "active_subscriptions"
+    REFERRALS = "referrals"
+    PAYMENTS_APPROVED = "payments_approved"
+    # Сумма к оплате по активным подпискам с учетом реферальных скидок
+    MONTHLY_REVENUE = "monthly_revenue"
+
+
+class AudienceSegment(StrEnum):
+    ALL = "all"
+    ACTIVE = "active"
+    INACTIVE = "inactive"
+    EXPIRING = "expiring"
+    LANGUAGE = "language"
+    REFERRERS = "referrers"
+
+
+@dataclass
+class Audience:
+    """Получатели рассылки; ``days`` и ``language_code`` нужны сегментам EXPIRING и LANGUAGE."""
+
+    segment: AudienceSegment = AudienceSegment.ALL
+    days: int = 0
+    language_code: str = ""
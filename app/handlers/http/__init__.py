@@ -0,0 +1,11 @@
+from aiohttp import web
+
+from app.handlers.http.metrics import routes as metrics_routes
+from app.handlers.http.subscriptions import routes as subscription_routes
+
+
+def create_app() -> web.Application:
+    app = web.Application()
+    app.add_routes(metrics_routes)
+    app.add_routes(subscription_routes)
+    return app
@@ -0,0 +1,12 @@
+from aiohttp import web
+
+from app import metrics
+
+routes = web.RouteTableDef()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@routes.get("/metrics")
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(body=metrics.registry.render().encode(), headers={"Content-Type": CONTENT_TYPE})
@@ -0,0 +1,30 @@
+from aiohttp import web
+
+from app.adapters.xui.subscriptions import CachedSubscription
+from app.handlers.telegram.deps import get_subscription_cache
+
+routes = web.RouteTableDef()
+
+
+@routes.get(r"/sub/{user_id:\d+}")
+async def subscription_handler(request: web.Request) -> web.Response:
+    subscription = await get_subscription_cache().get(int(request.match_info["user_id"]))
+    if subscription is None:
+        raise web.HTTPNotFound()
+
+    if _not_modified(request, subscription):
+        response = web.Response(status=304)
+    else:
+        response = web.Response(body=subscription.body, headers=subscription.headers)
+    response.etag = subscription.etag
+    response.last_modified = subscription.last_modified
+    return response
+
+
+def _not_modified(request: web.Request, subscription: CachedSubscription) -> bool:
+    # If-None-Match приоритетнее If-Modified-Since (RFC 9110)
+    if request.if_none_match is not None:
+        return any(tag.value in (subscription.etag, "*") for tag in request.if_none_match)
+    if request.if_modified_since is not None:
+        return subscription.last_modified <= request.if_modified_since
+    return False
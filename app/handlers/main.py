@@ -6,23 +6,111 @@ from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from aiogram.types import BotCommand
+from aiohttp import web
 
+from app import tracing
+from app.adapters.postgresql.migrations import migrate_to_head
+from app.adapters.telegram.sender import RateLimitedSender
+from app.handlers.http import create_app
 from app.handlers.telegram import root
+from app.handlers.telegram.deps import (
+    get_database,
+    get_expiry_scheduler,
+    get_lifecycle,
+    get_read_database,
+    get_subscription_cache,
+    get_subscription_index,
+    get_xui_pool,
+)
+from app.handlers.telegram.middlewares import (
+    InFlightMiddleware,
+    MetricsMiddleware,
+    TelegramRequestMiddleware,
+    ThrottlingMiddleware,
+    TracingMiddleware,
+)
 from app.settings import settings
-from app.tasks.subscriptions import monthly_check_loop
+from app.tasks.leader import run_as_leader
+from app.tasks.outbox import outbox_relay_loop
+from app.tasks.payments import payment_check_loop
+from app.tasks.reminders import reminder_loop
+from app.tasks.stats import stats_loop
+from app.tasks.subscription_cache import subscription_cache_listener
+from app.tasks.subscription_index import subscription_index_loop
+from app.tasks.subscriptions import expiry_loop
+from app.tasks.traffic import traffic_loop
+
+logger = logging.getLogger(__name__)
 
 dp = Dispatcher()
 dp.include_router(root)
+dp.update.outer_middleware(InFlightMiddleware(get_lifecycle()))
+throttling_middleware = ThrottlingMiddleware()
+for observer in (dp.message, dp.callback_query):
+    # Отброшенные апдейты не попадают в метрики и трейсы обработчиков
+    observer.outer_middleware(throttling_middleware)
+    observer.outer_middleware(MetricsMiddleware())
+    observer.outer_middleware(TracingMiddleware())
 
 
 async def main() -> None:
+    if settings.tracing_enabled:
+        tracing.setup(
+            sample_rate=settings.tracing_sample_rate,
+            file_path=settings.tracing_file_path,
+            otlp_endpoint=settings.tracing_otlp_endpoint,
+        )
+
+    if settings.migrate_on_start:
+        await migrate_to_head(get_database())
+
     bot = Bot(
         token=settings.bot_token,
         default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN_V2),
     )
+    bot.session.middleware(TelegramRequestMiddleware(max_retries=settings.telegram_max_retries))
+
+    runner = web.AppRunner(create_app())
+    await runner.setup()
+    await web.TCPSite(runner, settings.http_host, settings.http_port).start()
+
     await bot.set_my_commands([BotCommand(command="start", description="Главное меню")])
-    asyncio.create_task(monthly_check_loop(bot))
-    await dp.start_polling(bot)
+    sender = RateLimitedSender(bot, messages_per_second=settings.telegram_messages_per_second)
+    # Общий лимит скорости для фоновых задач и рассылок из обработчиков
+    dp["sender"] = sender
+    lifecycle = get_lifecycle()
+    if settings.database_replica_urls:
+        lifecycle.spawn(get_read_database().monitor_lag(), "replica_lag", drain=False)
+    # Индекс подписок свой у каждой реплики, поэтому без выбора лидера
+    lifecycle.spawn(subscription_index_loop(get_subscription_index()), "subscription_index")
+    lifecycle.spawn(subscription_cache_listener(get_subscription_cache()), "subscription_cache", drain=False)
+    lifecycle.spawn(run_as_leader("expiry", lambda: expiry_loop(sender, get_expiry_scheduler())), "expiry")
+    lifecycle.spawn(run_as_leader("reminders", lambda: reminder_loop(sender)), "reminders")
+    lifecycle.spawn(run_as_leader("payment_checks", lambda: payment_check_loop(bot)), "payment_checks")
+    lifecycle.spawn(run_as_leader("outbox", lambda: outbox_relay_loop(get_xui_pool())), "outbox")
+    lifecycle.spawn(run_as_leader("traffic", lambda: traffic_loop(get_xui_pool())), "traffic")
+    lifecycle.spawn(run_as_leader("stats", stats_loop), "stats")
+    try:
+        # По SIGTERM/SIGINT aiogram прекращает получать апдейты и возвращает управление
+        await dp.start_polling(bot, close_bot_session=False)
+    finally:
+        await shutdown(bot, runner)
+
+
+async def shutdown(bot: Bot, runner: web.AppRunner) -> None:
+    """Дожидается начатых апдейтов и проходов фоновых задач, затем закрывает ресурсы."""
+    logger.info("Shutting down, draining for up to %ss", settings.shutdown_timeout_seconds)
+    await get_lifecycle().stop(settings.shutdown_timeout_seconds)
+    await runner.cleanup()
+    await get_subscription_cache().close()
+    await get_xui_pool().close()
+    await get_read_database().close()
+    await get_database().close()
+    # Сессия бота закрывается последней: до этого ей отвечают дренируемые обработчики
+    await bot.session.close()
+    if tracing.tracer:
+        await tracing.tracer.shutdown()
+    logger.info("Shutdown complete")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,51 @@
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import F, Router, types
+from aiogram.dispatcher.event.bases import SkipHandler
+from aiogram.dispatcher.event.handler import CallableObject
+
+SEPARATOR = ":"
+
+CallbackHandler = Callable[..., Awaitable[Any]]
+
+
+def pack(action: str, *args: object) -> str:
+    # Telegram ограничивает callback_data 64 байтами
+    return SEPARATOR.join([action, *(str(arg) for arg in args)])
+
+
+def unpack(data: str) -> tuple[str, list[str]]:
+    action, *args = data.split(SEPARATOR)
+    return action, args
+
+
+class CallbackRouter(Router):
+    """Роутер callback-запросов с диспетчеризацией по словарю.
+
+    Вместо отдельного фильтра на каждую кнопку регистрируется один обработчик,
+    который разбирает callback_data вида ``action:arg1:arg2`` и находит обработчик
+    действия за O(1). Аргументы передаются в обработчик как ``callback_args``.
+    """
+
+    def __init__(self, *, name: str | None = None) -> None:
+        super().__init__(name=name)
+        self.actions: dict[str, CallableObject] = {}
+        self.callback_query(F.data)(self._dispatch)
+
+    def action(self, action: str) -> Callable[[CallbackHandler], CallbackHandler]:
+        def decorator(handler: CallbackHandler) -> CallbackHandler:
+            if action in self.actions:
+                raise ValueError(f"Callback action {action!r} is already registered")
+            self.actions[action] = CallableObject(handler)
+            return handler
+
+        return decorator
+
+    async def _dispatch(self, callback_query: types.CallbackQuery, **kwargs: Any) -> Any:
+        action, args = unpack(callback_query.data or "")
+        handler = self.actions.get(action)
+        if handler is None:
+            # Даем шанс другим роутерам обработать это действие
+            raise SkipHandler
+        return await handler.call(callback_query, callback_action=action, callback_args=args, **kwargs)
@@ -1,10 +1,61 @@
 from functools import lru_cache
 
-from vi_core.sqlalchemy import AsyncDatabase
-
+from app.adapters.postgresql.database import Database, ReadDatabase
+from app.adapters.xui.pool import XuiPool
+from app.adapters.xui.subscriptions import SubscriptionCache
+from app.lifecycle import Lifecycle
+from app.referral_trees import ReferralTreeCache
 from app.settings import settings
+from app.subscription_index import SubscriptionIndex
+from app.tasks.scheduler import DeadlineScheduler
+
+
+@lru_cache()
+def get_database() -> Database:
+    return Database(pg_dsn=str(settings.database_url), direct_dsn=settings.database_direct_url)
+
+
+@lru_cache()
+def get_read_database() -> ReadDatabase:
+    return ReadDatabase(primary=get_database(), replica_dsns=settings.database_replica_urls)
+
+
+@lru_cache()
+def get_lifecycle() -> Lifecycle:
+    return Lifecycle()
+
+
+@lru_cache()
+def get_expiry_scheduler() -> DeadlineScheduler:
+    return DeadlineScheduler()
+
+
+@lru_cache()
+def get_subscription_index() -> SubscriptionIndex:
+    return SubscriptionIndex(settle=get_read_database().settle)
+
+
+def get_user_read_database(user_id: int) -> Database | ReadDatabase:
+    """База для чтения данных пользователя: сразу после его изменений реплика может их еще не видеть."""
+    if get_subscription_index().recently_changed(user_id):
+        return get_database()
+    return get_read_database()
+
+
+@lru_cache()
+def get_referral_trees() -> ReferralTreeCache:
+    return ReferralTreeCache(
+        ttl=settings.referral_tree_cache_ttl_seconds,
+        size=settings.referral_tree_cache_size,
+        settle=get_read_database().settle,
+    )
+
+
+@lru_cache()
+def get_xui_pool() -> XuiPool:
+    return XuiPool(settings.xui_pool)
 
 
 @lru_cache()
-def get_database() -> AsyncDatabase:
-    return AsyncDatabase(pg_dsn=str(settings.database_url))
+def get_subscription_cache() -> SubscriptionCache:
+    return SubscriptionCache(get_read_database())
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware, Bot, types
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from aiogram.methods import GetUpdates, Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from app import metrics, tracing
+from app.handlers.telegram.callbacks import unpack
+from app.lifecycle import Lifecycle
+from app.messages import CallbackData, Commands, FSMStates, StatusMessages
+from app.settings import settings
+from app.throttling import TokenBuckets
+
+logger = logging.getLogger(__name__)
+
+
+# Метки берутся только из известных значений: текст команды и callback_data присылает пользователь,
+# и произвольные значения размножили бы серии метрик, ключи корзин и имена спанов
+COMMAND_LABELS = frozenset(f"/{command}" for command in Commands)
+UNKNOWN_LABEL = "other"
+
+
+def handler_label(event: types.TelegramObject, data: dict[str, Any]) -> str:
+    if isinstance(event, types.CallbackQuery):
+        action = unpack(event.data or "")[0]
+        return action if action in CallbackData else UNKNOWN_LABEL
+    if isinstance(event, types.Message):
+        if event.text and event.text.startswith("/"):
+            command = event.text.split(maxsplit=1)[0].split("@", 1)[0]
+            return command if command in COMMAND_LABELS else UNKNOWN_LABEL
+        state = data.get("raw_state")
+        if state is None:
+            return "message"
+        return state if state in FSMStates else UNKNOWN_LABEL
+    return type(event).__name__
+
+
+class MetricsMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[types.TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: types.TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        labels = {"event": type(event).__name__, "handler": handler_label(event, data)}
+        with metrics.HANDLER_SECONDS.time(**labels, outcome="error") as observed:
+            result = await handler(event, data)
+            observed["outcome"] = "success"
+            return result
+
+
+class TracingMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[types.TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: types.TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if tracing.tracer is None:
+            return await handler(event, data)
+        with tracing.span(f"handler {handler_label(event, data)}", event=type(event).__name__):
+            return await handler(event, data)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Отбрасывает апдейты пользователя сверх лимита его корзины для этого обработчика.
+
+    Апдейты приходят в одну реплику, которая держит getUpdates, поэтому корзин в памяти
+    процесса достаточно.
+    """
+
+    def __init__(self) -> None:
+        self.buckets = TokenBuckets()
+
+    async def __call__(
+        self,
+        handler: Callable[[types.TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: types.TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        label = handler_label(event, data)
+        if user is None or user.id == settings.admin_id or label in settings.throttle_exempt:
+            return await handler(event, data)
+
+        limit = settings.throttle_limits.get(label, settings.throttle_default)
+        if self.buckets.allow(user.id, label, limit.rate, limit.burst):
+            return await handler(event, data)
+
+        metrics.THROTTLED_UPDATES.inc(handler=label)
+        # На сообщения не отвечаем, чтобы флуд не превращался в исходящие запросы
+        if isinstance(event, types.CallbackQuery):
+            await event.answer(StatusMessages.THROTTLED)
+        return None
+
+
+class InFlightMiddleware(BaseMiddleware):
+    """Учитывает обрабатываемые апдейты, чтобы при остановке дождаться их завершения."""
+
+    def __init__(self, lifecycle: Lifecycle) -> None:
+        self.lifecycle = lifecycle
+
+    async def __call__(
+        self,
+        handler: Callable[[types.TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: types.TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        with self.lifecycle.track():
+            return await handler(event, data)
+
+
+class TelegramRequestMiddleware(BaseRequestMiddleware):
+    """Считает ошибки Bot API и повторяет запросы, отклоненные flood control."""
+
+    def __init__(self, max_retries: int = 3) -> None:
+        self.max_retries = max_retries
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        api_method = method.__api_method__
+        attempt = 0
+        while True:
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                metrics.TELEGRAM_API_ERRORS.inc(method=api_method, error=type(e).__name__)
+                if attempt >= self.max_retries or isinstance(method, GetUpdates):
+                    raise
+                attempt += 1
+                metrics.TELEGRAM_API_RETRIES.inc(method=api_method)
+                logger.warning("Flood control on %s, retry in %s seconds", api_method, e.retry_after)
+                await asyncio.sleep(e.retry_after)
+            except TelegramAPIError as e:
+                metrics.TELEGRAM_API_ERRORS.inc(method=api_method, error=type(e).__name__)
+                raise
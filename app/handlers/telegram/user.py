@@ -1,16 +1,24 @@
-from aiogram import Router, types
-from aiogram.filters import Command, CommandStart, StateFilter
+from aiogram import types
+from aiogram.filters import Command, CommandObject, CommandStart, StateFilter
 from aiogram.fsm.context import FSMContext
-from vi_core.sqlalchemy import UnitOfWork
 
 from app import messages
 from app.adapters.postgresql import repositories
-from app.adapters.xui.client import XuiClient
-from app.handlers.telegram.deps import get_database
-from app.settings import settings
+from app.adapters.postgresql.unit_of_work import UnitOfWork
+from app.adapters.telegram.sender import RateLimitedSender
+from app.handlers.telegram.callbacks import CallbackRouter
+from app.handlers.telegram.deps import (
+    get_database,
+    get_expiry_scheduler,
+    get_lifecycle,
+    get_read_database,
+    get_referral_trees,
+    get_subscription_index,
+    get_user_read_database,
+)
 from app.usecases import user
 
-router = Router()
+router = CallbackRouter()
 
 
 @router.message(CommandStart())
@@ -19,45 +27,52 @@ async def command_start_handler(message: types.Message, state: FSMContext) -> No
     async with database.session() as session:
         user_repository = repositories.UserRepository(session=session)
         uow = UnitOfWork(session=session)
-        subscription_repository = repositories.SubscriptionRepository(session=session)
-        referral_repository = repositories.ReferralRepository(session=session)
-        xui_client = XuiClient(base_url=settings.xui_url_panel)
+        outbox_repository = repositories.OutboxRepository(session=session)
+        stats_repository = repositories.StatsRepository(session=session)
 
         start_user_usecase = user.StartUserUsecase(
             user_repository=user_repository,
             uow=uow,
-            subscription_repository=subscription_repository,
-            referral_repository=referral_repository,
-            xui_client=xui_client,
+            outbox_repository=outbox_repository,
+            stats_repository=stats_repository,
+            expiry_scheduler=get_expiry_scheduler(),
+            subscription_index=get_subscription_index(),
+            referral_trees=get_referral_trees(),
         )
         await start_user_usecase(message, state)
 
 
-@router.message(Command("broadcast"))
-async def command_broadcast_handler(message: types.Message, state: FSMContext) -> None:
+@router.message(Command(messages.Commands.BROADCAST))
+async def command_broadcast_handler(message: types.Message, state: FSMContext, command: CommandObject) -> None:
     database = get_database()
     async with database.session() as session:
         user_repository = repositories.UserRepository(session=session)
 
         broadcast_usecase = user.BroadcastUsecase(user_repository=user_repository)
-        await broadcast_usecase(message, state)
+        await broadcast_usecase(message, state, args=command.args)
 
 
-@router.callback_query(lambda message: message.data == messages.CallbackData.ACCOUNT)
+@router.action(messages.CallbackData.ACCOUNT)
 async def process_account_callback(callback_query: types.CallbackQuery) -> None:
-    database = get_database()
+    database = get_user_read_database(callback_query.from_user.id)
     async with database.session() as session:
         user_repository = repositories.UserRepository(session=session)
         uow = UnitOfWork(session=session)
+        placement_repository = repositories.PlacementRepository(session=session)
+        traffic_repository = repositories.TrafficRepository(session=session)
 
-        account_usecase = user.AccountUsecase(user_repository=user_repository,
-                                              uow=uow)
+        account_usecase = user.AccountUsecase(
+            user_repository=user_repository,
+            uow=uow,
+            placement_repository=placement_repository,
+            traffic_repository=traffic_repository,
+        )
         await account_usecase(callback_query)
 
 
-@router.callback_query(lambda message: message.data == messages.CallbackData.TEAM)
+@router.action(messages.CallbackData.TEAM)
 async def process_referral_callback(callback_query: types.CallbackQuery) -> None:
-    database = get_database()
+    database = get_user_read_database(callback_query.from_user.id)
     async with database.session() as session:
         user_repository = repositories.UserRepository(session=session)
         referral_repository = repositories.ReferralRepository(session=session)
@@ -65,53 +80,53 @@ async def process_referral_callback(callback_query: types.CallbackQuery) -> None
         referral_usecase = user.ReferralUsecase(
             user_repository=user_repository,
             referral_repository=referral_repository,
+            referral_trees=get_referral_trees(),
         )
         await referral_usecase(callback_query)
 
 
-@router.callback_query(lambda message: message.data == messages.CallbackData.NOTIFICATIONS)
+@router.action(messages.CallbackData.NOTIFICATIONS)
 async def process_notifications_callback(callback_query: types.CallbackQuery) -> None:
     database = get_database()
     async with database.session() as session:
-        user_repository = repositories.UserRepository(session=session)
         uow = UnitOfWork(session=session)
         subscription_repository = repositories.SubscriptionRepository(session=session)
 
         notifications_usecase = user.NotificationsUsecase(
-            user_repository=user_repository,
             uow=uow,
             subscription_repository=subscription_repository,
+            subscription_index=get_subscription_index(),
         )
         await notifications_usecase(callback_query)
 
 
-@router.callback_query(lambda message: message.data == messages.CallbackData.INSTRUCTIONS)
+@router.action(messages.CallbackData.INSTRUCTIONS)
 async def process_instructions_callback(callback_query: types.CallbackQuery) -> None:
     instructions_usecase = user.InstructionsUsecase()
     await instructions_usecase(callback_query)
 
 
-@router.callback_query(lambda message: message.data == messages.CallbackData.INSTRUCTION_CONNECT)
+@router.action(messages.CallbackData.INSTRUCTION_CONNECT)
 async def process_instruction_connect_callback(callback_query: types.CallbackQuery) -> None:
     if callback_query.message:
         await callback_query.message.answer(messages.InstructionTexts.CONNECT, disable_web_page_preview=True)
 
 
-@router.callback_query(lambda message: message.data == messages.CallbackData.INSTRUCTION_REFERRAL)
+@router.action(messages.CallbackData.INSTRUCTION_REFERRAL)
 async def process_instruction_referral_callback(callback_query: types.CallbackQuery) -> None:
     if callback_query.message:
         await callback_query.message.answer(messages.InstructionTexts.REFERRAL, disable_web_page_preview=True)
 
 
-@router.callback_query(lambda message: message.data == messages.CallbackData.INSTRUCTION_UPDATE)
+@router.action(messages.CallbackData.INSTRUCTION_UPDATE)
 async def process_instruction_update_callback(callback_query: types.CallbackQuery) -> None:
     if callback_query.message:
         await callback_query.message.answer(messages.InstructionTexts.UPDATE, disable_web_page_preview=True)
 
 
-@router.callback_query(lambda message: message.data == messages.CallbackData.DONATE)
+@router.action(messages.CallbackData.DONATE)
 async def command_donate_handler(callback_query: types.CallbackQuery) -> None:
-    database = get_database()
+    database = get_user_read_database(callback_query.from_user.id)
     async with database.session() as session:
         user_repository = repositories.UserRepository(session=session)
         subscription_repository = repositories.SubscriptionRepository(session=session)
@@ -120,18 +135,19 @@ async def command_donate_handler(callback_query: types.CallbackQuery) -> None:
             user_repository=user_repository,
             subscription_repository=subscription_repository,
             referral_repository=referral_repository,
+            subscription_index=get_subscription_index(),
+            referral_trees=get_referral_trees(),
         )
         await donate_usecase(callback_query)
 
 
-@router.callback_query(lambda message: message.data == messages.CallbackData.SUPPORT)
+@router.action(messages.CallbackData.SUPPORT)
 async def start_support(callback_query: types.CallbackQuery, state: FSMContext) -> None:
     support_usecase = user.SupportUsecase()
     await support_usecase(callback_query, state)
 
 
-
-@router.callback_query(lambda message: message.data == messages.CallbackData.SEND_CHECK)
+@router.action(messages.CallbackData.SEND_CHECK)
 async def send_check(callback_query: types.CallbackQuery, state: FSMContext) -> None:
     send_check_usecase = user.SendCheckUsecase()
     await send_check_usecase(callback_query, state)
@@ -141,20 +157,113 @@ async def send_check(callback_query: types.CallbackQuery, state: FSMContext) ->
 async def forward_check_to_admin(message: types.Message, state: FSMContext) -> None:
     database = get_database()
     async with database.session() as session:
-        user_repository = repositories.UserRepository(session=session)
-        subscription_repository = repositories.SubscriptionRepository(session=session)
-        xui_client = XuiClient(base_url=settings.xui_url_panel)
         uow = UnitOfWork(session=session)
+        payment_check_repository = repositories.PaymentCheckRepository(session=session)
 
         send_check_usecase = user.SendMessageCheckUsecase(
-            user_repository=user_repository,
-            subscription_repository=subscription_repository,
             uow=uow,
-            xui_client=xui_client,
+            payment_check_repository=payment_check_repository,
         )
         await send_check_usecase(message, state)
 
 
+@router.message(Command(messages.Commands.PENDING))
+async def command_pending_handler(message: types.Message) -> None:
+    database = get_database()
+    async with database.session() as session:
+        payment_check_repository = repositories.PaymentCheckRepository(session=session)
+
+        pending_usecase = user.PendingPaymentChecksUsecase(payment_check_repository=payment_check_repository)
+        await pending_usecase(message)
+
+
+@router.message(Command(messages.Commands.STATS))
+async def command_stats_handler(message: types.Message) -> None:
+    database = get_read_database()
+    async with database.session() as session:
+        stats_repository = repositories.StatsRepository(session=session)
+
+        stats_usecase = user.StatsUsecase(stats_repository=stats_repository)
+        await stats_usecase(message)
+
+
+@router.message(Command(messages.Commands.FIND))
+async def command_find_handler(message: types.Message, state: FSMContext, command: CommandObject) -> None:
+    database = get_read_database()
+    async with database.session() as session:
+        user_repository = repositories.UserRepository(session=session)
+
+        find_usecase = user.FindUsersUsecase(user_repository=user_repository)
+        await find_usecase(message, state, query=command.args)
+
+
+@router.action(messages.CallbackData.FIND_PAGE)
+async def process_find_page(callback_query: types.CallbackQuery, state: FSMContext, callback_args: list[str]) -> None:
+    database = get_read_database()
+    async with database.session() as session:
+        user_repository = repositories.UserRepository(session=session)
+
+        find_page_usecase = user.FindUsersPageUsecase(user_repository=user_repository)
+        await find_page_usecase(callback_query, state, page=int(callback_args[0]))
+
+
+@router.action(messages.CallbackData.CHECK_APPROVE)
+async def process_check_approve(callback_query: types.CallbackQuery, callback_args: list[str]) -> None:
+    database = get_database()
+    async with database.session() as session:
+        uow = UnitOfWork(session=session)
+        payment_check_repository = repositories.PaymentCheckRepository(session=session)
+        subscription_repository = repositories.SubscriptionRepository(session=session)
+        outbox_repository = repositories.OutboxRepository(session=session)
+        stats_repository = repositories.StatsRepository(session=session)
+
+        approve_usecase = user.ApprovePaymentChecksUsecase(
+            uow=uow,
+            payment_check_repository=payment_check_repository,
+            subscription_repository=subscription_repository,
+            outbox_repository=outbox_repository,
+            stats_repository=stats_repository,
+            expiry_scheduler=get_expiry_scheduler(),
+            subscription_index=get_subscription_index(),
+            referral_trees=get_referral_trees(),
+        )
+        await approve_usecase(callback_query, check_ids=[int(callback_args[0])])
+
+
+@router.action(messages.CallbackData.CHECK_APPROVE_ALL)
+async def process_check_approve_all(callback_query: types.CallbackQuery, callback_args: list[str]) -> None:
+    database = get_database()
+    async with database.session() as session:
+        uow = UnitOfWork(session=session)
+        payment_check_repository = repositories.PaymentCheckRepository(session=session)
+        subscription_repository = repositories.SubscriptionRepository(session=session)
+        outbox_repository = repositories.OutboxRepository(session=session)
+        stats_repository = repositories.StatsRepository(session=session)
+
+        approve_usecase = user.ApprovePaymentChecksUsecase(
+            uow=uow,
+            payment_check_repository=payment_check_repository,
+            subscription_repository=subscription_repository,
+            outbox_repository=outbox_repository,
+            stats_repository=stats_repository,
+            expiry_scheduler=get_expiry_scheduler(),
+            subscription_index=get_subscription_index(),
+            referral_trees=get_referral_trees(),
+        )
+        await approve_usecase(callback_query, up_to_id=int(callback_args[0]))
+
+
+@router.action(messages.CallbackData.CHECK_REJECT)
+async def process_check_reject(callback_query: types.CallbackQuery, callback_args: list[str]) -> None:
+    database = get_database()
+    async with database.session() as session:
+        uow = UnitOfWork(session=session)
+        payment_check_repository = repositories.PaymentCheckRepository(session=session)
+
+        reject_usecase = user.RejectPaymentCheckUsecase(uow=uow, payment_check_repository=payment_check_repository)
+        await reject_usecase(callback_query, check_id=int(callback_args[0]))
+
+
 @router.message(StateFilter(messages.FSMStates.WAITING_FOR_SUPPORT_MESSAGE))
 async def forward_to_admin(message: types.Message, state: FSMContext) -> None:
     support_usecase = user.SupporMessagetUsecase()
@@ -163,7 +272,7 @@ async def forward_to_admin(message: types.Message, state: FSMContext) -> None:
 
 @router.message(StateFilter(messages.FSMStates.WAITING_FOR_BROADCAST_MESSAGE))
 async def process_broadcast_message(message: types.Message, state: FSMContext) -> None:
-    database = get_database()
+    database = get_read_database()
     async with database.session() as session:
         user_repository = repositories.UserRepository(session=session)
 
@@ -171,17 +280,17 @@ async def process_broadcast_message(message: types.Message, state: FSMContext) -
         await broadcast_message_usecase(message, state)
 
 
-@router.callback_query(lambda callback: callback.data == messages.CallbackData.BROADCAST_CONFIRM)
-async def process_broadcast_confirm(callback_query: types.CallbackQuery, state: FSMContext) -> None:
-    database = get_database()
-    async with database.session() as session:
-        user_repository = repositories.UserRepository(session=session)
-
-        broadcast_confirm_usecase = user.BroadcastConfirmUsecase(user_repository=user_repository)
-        await broadcast_confirm_usecase(callback_query, state)
+@router.action(messages.CallbackData.BROADCAST_CONFIRM)
+async def process_broadcast_confirm(
+    callback_query: types.CallbackQuery, state: FSMContext, sender: RateLimitedSender
+) -> None:
+    broadcast_confirm_usecase = user.BroadcastConfirmUsecase(
+        sender=sender, database=get_read_database(), lifecycle=get_lifecycle()
+    )
+    await broadcast_confirm_usecase(callback_query, state)
 
 
-@router.callback_query(lambda callback: callback.data == messages.CallbackData.BROADCAST_CANCEL)
+@router.action(messages.CallbackData.BROADCAST_CANCEL)
 async def process_broadcast_cancel(callback_query: types.CallbackQuery, state: FSMContext) -> None:
     broadcast_cancel_usecase = user.BroadcastCancelUsecase()
     await broadcast_cancel_usecase(callback_query, state)
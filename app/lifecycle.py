@@ -0,0 +1,78 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Coroutine, Iterator
+from contextlib import contextmanager, suppress
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class Lifecycle:
+    """Координирует остановку процесса.
+
+    Фоновые циклы проверяют ``running`` между проходами и спят через ``sleep``,
+    поэтому после ``stop`` они доводят текущий проход до коммита и выходят.
+    Обработчики апдейтов учитываются через ``track``; ``stop`` ждет и их, и циклы
+    до дедлайна, а незавершенное к дедлайну отменяет.
+    """
+
+    def __init__(self) -> None:
+        self.stopping = asyncio.Event()
+        self.in_flight = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.tasks: set[asyncio.Task[Any]] = set()
+        self.helpers: set[asyncio.Task[Any]] = set()
+
+    @property
+    def running(self) -> bool:
+        return not self.stopping.is_set()
+
+    def spawn(self, coroutine: Coroutine[Any, Any, Any], name: str, drain: bool = True) -> asyncio.Task[Any]:
+        """Запускает фоновую задачу; с ``drain=False`` она отменяется сразу при остановке."""
+        task = asyncio.create_task(coroutine, name=name)
+        tasks = self.tasks if drain else self.helpers
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        return task
+
+    async def interruptible(self, awaitable: Awaitable[Any]) -> None:
+        """Ждет ``awaitable``, но не дольше начала остановки."""
+        waiter = asyncio.ensure_future(awaitable)
+        stopped = asyncio.ensure_future(self.stopping.wait())
+        try:
+            await asyncio.wait({waiter, stopped}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for future in (waiter, stopped):
+                future.cancel()
+                with suppress(asyncio.CancelledError):
+                    await future
+
+    async def sleep(self, seconds: float) -> None:
+        await self.interruptible(asyncio.sleep(seconds))
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        self.in_flight += 1
+        self.idle.clear()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if not self.in_flight:
+                self.idle.set()
+
+    async def stop(self, timeout: float) -> None:
+        self.stopping.set()
+        for task in self.helpers:
+            task.cancel()
+
+        idle = asyncio.ensure_future(self.idle.wait())
+        _, pending = await asyncio.wait({idle, *self.tasks}, timeout=timeout)
+        idle.cancel()
+        if self.in_flight:
+            logger.warning("Shutdown deadline reached with %s updates in flight", self.in_flight)
+        for task in pending - {idle}:
+            logger.warning("Shutdown deadline reached, cancelling %s", task.get_name())
+            task.cancel()
+        await asyncio.gather(*self.tasks, *self.helpers, return_exceptions=True)
@@ -16,12 +16,16 @@ ACCOUNT_TEXT = """👤 *Имя пользователя:* `{username}`
 💎 *Статус подписки:* `{subscription_status}`
 
 📅 *Дата окончания:* `{end_date}`
+
+📊 *Трафик:* `{traffic}`
 """
 
 REFERRAL_TEXT = """👥 *Реферальная программа*
 
 Скидка за реферальную программу: `{discount}%`
 
+Всего в сети: `{descendants}`, активных: `{active_descendants}`, уровней: `{depth}`
+
 Ваши рефералы:
 {referrals}
 
@@ -41,21 +45,73 @@ INSTRUCTIONS_TEXT = """📋 *Инструкции по использовани
 
 SUBSCRIPTION_EXPIRED_MESSAGE = "🔔 Время оплатить подписку\\!"
 
+SUBSCRIPTION_REMINDER_MESSAGE = """🔔 Ваша подписка закончится `{end_date}`
+
+Продлите ее заранее, чтобы не потерять доступ\\!"""
+
 # Сообщения для рассылки
 BROADCAST_REQUEST_MESSAGE = """📢 *Массовая рассылка*
 
-Отправьте сообщение, которое будет разослано всем пользователям бота\\."""
+Аудитория: `{audience}`
+
+Отправьте сообщение, которое будет разослано пользователям этой аудитории\\."""
+
+BROADCAST_USAGE_MESSAGE = """Использование: /broadcast [аудитория]
+
+all - все пользователи (по умолчанию)
+active - с активной подпиской
+inactive - с неактивной подпиской
+expiring <дни> - подписка истекает в ближайшие дни
+language <код> - язык Telegram, например ru
+referrers - пригласившие хотя бы одного реферала"""
 
 BROADCAST_CONFIRMATION_MESSAGE = """📢 Подтверждение рассылки
 
+Аудитория: {audience}
 Сообщение будет отправлено {count} пользователям.
 
 Вы уверены?"""
 
+BROADCAST_STARTED_MESSAGE = "📢 Рассылка запущена, итог придет отдельным сообщением"
+
 BROADCAST_SUCCESS_MESSAGE = "✅ Рассылка завершена! Отправлено сообщений: {sent} из {total}"
 
+BROADCAST_INTERRUPTED_MESSAGE = "⚠️ Рассылка прервана остановкой бота. Отправлено сообщений: {sent} из {total}"
+
 BROADCAST_CANCELLED_MESSAGE = "❌ Рассылка отменена"
 
+# Сообщения для проверки чеков (отправляются без markdown парсинга)
+PENDING_CHECKS_MESSAGE = """💸 Чеки на проверке: {count}
+
+{checks}"""
+
+NO_PENDING_CHECKS_MESSAGE = "Нет чеков на проверке"
+
+CHECKS_APPROVED_MESSAGE = "✅ Подтверждено чеков: {count}"
+
+CHECK_REJECTED_MESSAGE = "❌ Чек отклонен"
+
+# Поиск пользователей администратором (отправляется без markdown парсинга)
+FIND_USAGE_MESSAGE = "Использование: /find <username, имя или id>"
+
+FIND_RESULTS_MESSAGE = """🔎 Поиск «{query}», страница {page}:
+
+{users}"""
+
+FIND_NO_RESULTS_MESSAGE = "Никого не найдено по запросу «{query}»"
+
+# Статистика для администратора
+STATS_TEXT = """📊 *Статистика*
+
+👥 Пользователей: `{users}`
+💎 Активных подписок: `{active_subscriptions}`
+🤝 Рефералов: `{referrals}`
+✅ Подтверждено чеков: `{payments_approved}`
+💰 Выручка в месяц: `{monthly_revenue} ₽`
+
+📈 *Регистрации за {days} дн\\.:*
+{signups}"""
+
 
 # Enum для статусных сообщений
 class StatusMessages(StrEnum):
@@ -69,10 +125,15 @@ class StatusMessages(StrEnum):
     SUBSCRIPTION_NO_END_DATE = "необходима подписка"
     SUBSCRIPTION_ALREADY_ACTIVE = "У вас уже есть активная подписка, можете продлить ее"
     SUBSCRIPTION_NO_KEY = "необходима подписка"
+    TRAFFIC_UNKNOWN = "нет данных"
+
+    # Ограничение частоты
+    THROTTLED = "Слишком много запросов, попробуйте чуть позже"
 
     # Сообщения
     MESSAGE_SENT = "Ваше сообщение отправлено"
     MESSAGE_SENT_ACCESS_GRANTED = "Ваше сообщение отправлено, проверьте ваш аккаунт"
+    PAYMENT_REJECTED = "❌ Оплата не подтверждена\\. Если это ошибка, напишите в поддержку"
     ONLY_PHOTO_OR_DOCUMENT = "Необходимо отправить только фото или документ"
 
     # Перевыдача ключа
@@ -99,7 +160,12 @@ class MessageTemplates(StrEnum):
 2️⃣ Оплатите не ~500~, а `{amount} рублей`
 3️⃣ Отправьте скриншот оплаты в поддержку"""
     END_DATE_FORMAT = "{date} - {days}{days_text}"
+    TRAFFIC_FORMAT = "↑ {up:.2f} ГБ, ↓ {down:.2f} ГБ"
+    PAYMENT_APPROVED = "✅ Оплата подтверждена\\! Подписка продлена до `{end_date}`"
+    PENDING_CHECK_FORMAT = "#{id} @{username} {date}: {text}"
+    FOUND_USER_FORMAT = "{id} {first_name} @{username} - {status}, до {end_date}"
     REFERRAL_USER_FORMAT = "{first_name} \\(@{username}\\){separator}{status}\n"
+    SIGNUPS_DAY_FORMAT = "`{date}`: `{count}`\n"
 
 
 # Enum для текстов кнопок
@@ -131,6 +197,15 @@ class ButtonTexts(StrEnum):
     BROADCAST_CONFIRM = "✅ Подтвердить"
     BROADCAST_CANCEL = "❌ Отменить"
 
+    # Проверка чеков
+    CHECK_APPROVE = "✅ Подтвердить"
+    CHECK_REJECT = "❌ Отклонить"
+    CHECK_APPROVE_ALL = "✅ Подтвердить все"
+
+    # Постраничный вывод
+    PREVIOUS_PAGE = "◀️ Назад"
+    NEXT_PAGE = "Вперед ▶️"
+
 
 # Enum для инструкций
 class InstructionTexts(StrEnum):
@@ -180,10 +255,24 @@ class CallbackData(StrEnum):
     INSTRUCTION_UPDATE = "instruction_update"
     BROADCAST_CONFIRM = "broadcast_confirm"
     BROADCAST_CANCEL = "broadcast_cancel"
+    CHECK_APPROVE = "check_approve"
+    CHECK_REJECT = "check_reject"
+    CHECK_APPROVE_ALL = "check_approve_all"
     KEY = "key"
     REISSUE_KEY = "reissue_key"
     SWAP_COUNTRY = "swap_country"
     SWAP_PROTOCOL = "swap_protocol"
+    FIND_PAGE = "find_page"
+
+
+# Команды бота
+class Commands(StrEnum):
+    START = "start"
+    BROADCAST = "broadcast"
+    PENDING = "pending"
+    STATS = "stats"
+    FIND = "find"
+
 
 # Состояния FSM
 class FSMStates(StrEnum):
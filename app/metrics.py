@@ -0,0 +1,207 @@
+import functools
+import inspect
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    type: str = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+    def _key(self, labels: dict[str, Any]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}", *self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for key, value in self.values.items():
+            yield f"{self.name}_total{_format_labels(self.labelnames, key)} {value}"
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        collect: Callable[[], dict[LabelValues, float]] | None = None,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.values: dict[LabelValues, float] = {}
+        self.collect = collect
+
+    def set(self, value: float, **labels: Any) -> None:
+        self.values[self._key(labels)] = value
+
+    def samples(self) -> Iterator[str]:
+        values = self.collect() if self.collect else self.values
+        for key, value in values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        # Для каждого набора меток: счетчики по бакетам (+Inf последним), сумма
+        self.values: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        if key not in self.values:
+            self.values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = self.values[key]
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[dict[str, Any]]:
+        # Метки можно дополнить внутри блока, например outcome
+        labels = dict(labels)
+        started = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> Iterator[str]:
+        for key, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts, strict=True):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labelnames, key, f'le="{le}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {total[0]}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+
+M = TypeVar("M", bound=Metric)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: list[Metric] = []
+
+    def register(self, metric: M) -> M:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+registry = Registry()
+
+HANDLER_SECONDS = registry.register(
+    Histogram("brainsbot_handler_seconds", "Telegram handler latency", ("event", "handler", "outcome"))
+)
+THROTTLED_UPDATES = registry.register(
+    Counter("brainsbot_throttled_updates", "Updates dropped by per-user throttling", ("handler",))
+)
+DB_QUERY_SECONDS = registry.register(
+    Histogram("brainsbot_db_query_seconds", "Database time by repository method", ("method", "outcome"))
+)
+DB_POOL_CHECKOUT_SECONDS = registry.register(
+    Histogram("brainsbot_db_pool_checkout_seconds", "Time waiting for a pooled database connection", ("pool",))
+)
+DB_POOL_CONNECTIONS = registry.register(
+    Gauge("brainsbot_db_pool_connections", "Database pool connections by state", ("pool", "state"))
+)
+DB_REPLICA_LAG_SECONDS = registry.register(
+    Gauge("brainsbot_db_replica_lag_seconds", "Replication lag of read replicas", ("pool",))
+)
+XUI_REQUEST_SECONDS = registry.register(
+    Histogram("brainsbot_xui_request_seconds", "3x-ui panel request time", ("method", "outcome"))
+)
+XUI_CIRCUIT_STATE = registry.register(
+    Gauge("brainsbot_xui_circuit_state", "3x-ui circuit breaker state: 0 closed, 1 half-open, 2 open", ("server",))
+)
+XUI_SERVER_TRAFFIC_BYTES = registry.register(
+    Gauge("brainsbot_xui_server_traffic_bytes", "Accumulated client traffic by 3x-ui server", ("server", "direction"))
+)
+OUTBOX_DELIVERIES = registry.register(
+    Counter("brainsbot_outbox_deliveries", "3x-ui outbox delivery attempts", ("outcome",))
+)
+TELEGRAM_API_ERRORS = registry.register(
+    Counter("brainsbot_telegram_api_errors", "Telegram Bot API errors", ("method", "error"))
+)
+TELEGRAM_API_RETRIES = registry.register(
+    Counter("brainsbot_telegram_api_retries", "Telegram Bot API retries after flood control", ("method",))
+)
+TASK_SECONDS = registry.register(Histogram("brainsbot_task_seconds", "Background task pass duration", ("task",)))
+
+
+def instrumented(histogram: Histogram) -> Callable[[type[T]], type[T]]:
+    """Оборачивает публичные корутины класса замером времени с метками method и outcome."""
+
+    def decorator(cls: type[T]) -> type[T]:
+        for name, function in inspect.getmembers(cls, inspect.iscoroutinefunction):
+            if name.startswith("_"):
+                continue
+            setattr(cls, name, _timed(histogram, f"{cls.__name__}.{name}", function))
+        return cls
+
+    return decorator
+
+
+def _timed(histogram: Histogram, method: str, function: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(function)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        with histogram.time(method=method, outcome="error") as labels:
+            result = await function(*args, **kwargs)
+            labels["outcome"] = "success"
+            return result
+
+    return wrapper
@@ -0,0 +1,89 @@
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
+
+from app.entities import ReferralTree
+
+
+class ReferralTreeCache:
+    """Сводки по деревьям рефералов, закэшированные по рефереру в памяти процесса.
+
+    Новый реферал или смена статуса подписки меняют сводки всех предков
+    пользователя, поэтому кроме записей хранится обратный индекс ``roots``:
+    участник дерева -> рефереры, в чьих закэшированных сводках он учтен. Изменения
+    с других реплик сюда не доходят, их покрывает TTL записи.
+
+    Сводки читаются с реплики, которая может еще не видеть изменение, сбросившее
+    кэш. Поэтому в течение ``settle`` секунд после сброса сводки, задевающие
+    измененных пользователей, не кэшируются - иначе устаревшее дерево жило бы весь TTL.
+    """
+
+    def __init__(self, ttl: float, size: int, settle: float = 0) -> None:
+        self.ttl = ttl
+        self.size = size
+        self.settle = settle
+        self.entries: OrderedDict[int, tuple[ReferralTree, float]] = OrderedDict()
+        self.roots: dict[int, set[int]] = {}
+        # Пользователь -> время последнего сброса, по возрастанию времени
+        self.invalidated: OrderedDict[int, float] = OrderedDict()
+
+    def get(self, referrer_id: int) -> ReferralTree | None:
+        entry = self.entries.get(referrer_id)
+        if entry is None:
+            return None
+        tree, cached_at = entry
+        if time.monotonic() - cached_at >= self.ttl:
+            self._evict(referrer_id)
+            return None
+        self.entries.move_to_end(referrer_id)
+        return tree
+
+    def set(self, tree: ReferralTree) -> None:
+        self._evict(tree.referrer_id)
+        if self._unsettled(tree):
+            return
+        self.entries[tree.referrer_id] = (tree, time.monotonic())
+        for user_id in tree.descendant_ids:
+            self.roots.setdefault(user_id, set()).add(tree.referrer_id)
+        while len(self.entries) > self.size:
+            self._evict(next(iter(self.entries)))
+
+    def invalidate(self, user_ids: Iterable[int]) -> None:
+        """Сбрасывает сводки, затронутые изменением пользователей: их собственные и всех их предков."""
+        now = time.monotonic()
+        for user_id in user_ids:
+            if self.settle:
+                self.invalidated[user_id] = now
+                self.invalidated.move_to_end(user_id)
+            self._evict(user_id)
+            for referrer_id in list(self.roots.get(user_id, ())):
+                self._evict(referrer_id)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.roots.clear()
+        self.invalidated.clear()
+
+    def _unsettled(self, tree: ReferralTree) -> bool:
+        if not self.invalidated:
+            return False
+        since = time.monotonic() - self.settle
+        while self.invalidated:
+            user_id, invalidated_at = next(iter(self.invalidated.items()))
+            if invalidated_at >= since:
+                break
+            del self.invalidated[user_id]
+        if tree.referrer_id in self.invalidated:
+            return True
+        return any(user_id in self.invalidated for user_id in tree.descendant_ids)
+
+    def _evict(self, referrer_id: int) -> None:
+        entry = self.entries.pop(referrer_id, None)
+        if entry is None:
+            return
+        for user_id in entry[0].descendant_ids:
+            referrers = self.roots.get(user_id)
+            if referrers is not None:
+                referrers.discard(referrer_id)
+                if not referrers:
+                    del self.roots[user_id]
@@ -1,5 +1,25 @@
+from pydantic import BaseModel, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+DEFAULT_XUI_SERVER = "default"
+
+
+class XuiServer(BaseModel):
+    name: str
+    url_panel: str
+    url_subscriptions: str
+    username: str
+    password: str
+    inbound_id: int
+    # Относительная емкость для размещения новых клиентов; 0 - новых не принимает
+    weight: float = 1.0
+
+
+class ThrottleLimit(BaseModel):
+    # Пополнение корзины, токенов в секунду, и ее емкость
+    rate: float
+    burst: int
+
 
 class Settings(BaseSettings):
     bot_token: str
@@ -11,15 +31,146 @@ class Settings(BaseSettings):
     database_port: int
     database_name: str
 
+    database_pool_size: int = 10
+    database_max_overflow: int = 10
+    database_pool_timeout: float = 30
+    database_pool_pre_ping: bool = True
+    database_pool_recycle: int = 1800
+    # 0 - без ограничения; в режиме pgbouncer задается на роли в базе
+    database_statement_timeout_ms: int = 30_000
+    # Кэш подготовленных выражений SQLAlchemy на соединение; в режиме pgbouncer всегда 0
+    database_statement_cache_size: int = 100
+    # Совместимость с pgbouncer в режиме transaction pooling: без кэша подготовленных выражений
+    database_pgbouncer: bool = False
+    # Прямой DSN (postgresql+asyncpg://...) в обход pgbouncer для соединений, привязанных к сессии Postgres:
+    # advisory lock лидера и миграций, LISTEN. Обязателен вместе с database_pgbouncer
+    database_direct_url: str | None = None
+
+    # DSN реплик для чтения (JSON-список); пустой - все читается из мастера
+    database_replica_urls: list[str] = []
+    database_replica_max_lag_seconds: float = 5
+    database_replica_check_seconds: float = 5
+
     xui_url_panel: str
     xui_url_subscriptions: str
     xui_username: str
     xui_password: str
+    # Пул панелей и инбаундов (JSON-список); пустой - единственный сервер из xui_* выше.
+    # Уже существующие клиенты размещены на сервере с именем "default"
+    xui_servers: list[XuiServer] = []
+    # Защита бота от медленной или упавшей панели (на каждый сервер отдельно)
+    xui_request_timeout_seconds: float = 10
+    xui_max_concurrency: int = 10
+    xui_failure_threshold: int = 5
+    xui_reset_timeout_seconds: float = 30
+    xui_health_check_seconds: float = 15
+
+    http_host: str = "0.0.0.0"
+    http_port: int = 8080
+
+    # Публичный адрес HTTP-сервера бота; если задан, ссылки на подписку ведут в его кэширующий прокси
+    subscription_proxy_url: str | None = None
+    subscription_cache_ttl_seconds: int = 300
+    subscription_cache_size: int = 20_000
+
+    telegram_max_retries: int = 3
+
+    # Ограничение частоты апдейтов от одного пользователя по обработчикам (команда, действие кнопки
+    # или состояние FSM); дорогие обработчики ограничены сильнее, статические не ограничены
+    throttle_default: ThrottleLimit = ThrottleLimit(rate=1, burst=10)
+    throttle_limits: dict[str, ThrottleLimit] = {
+        "/start": ThrottleLimit(rate=0.1, burst=3),
+        "send_check": ThrottleLimit(rate=0.05, burst=3),
+        "waiting_for_check_message": ThrottleLimit(rate=0.05, burst=3),
+        "waiting_for_support_message": ThrottleLimit(rate=0.05, burst=3),
+    }
+    throttle_exempt: list[str] = ["instructions", "instruction_connect", "instruction_referral", "instruction_update"]
+
+    # Окно, на которое планировщик истечений загружает подписки из базы
+    expiry_horizon_minutes: int = 60
+
+    # За сколько дней до окончания подписки напоминать об оплате
+    reminder_days: list[int] = [3, 1]
+    reminder_interval_minutes: int = 15
+    # Ограничение скорости массовых отправок (напоминания, истечения, рассылки)
+    telegram_messages_per_second: float = 25
+    # Сколько получателей рассылки читается из базы за один запрос
+    broadcast_batch_size: int = 1000
+
+    # Сколько ждать начатые обработчики и проходы фоновых задач при остановке
+    shutdown_timeout_seconds: float = 20
+
+    # Накатывать миграции при старте бота; при схеме на head это один запрос к alembic_version
+    migrate_on_start: bool = True
+
+    # Фоновые задачи выполняет только реплика, держащая advisory lock в Postgres
+    leader_retry_seconds: int = 15
+    leader_heartbeat_seconds: int = 10
+
+    # Как часто каждая реплика перечитывает индекс подписок из базы
+    subscription_index_reload_seconds: int = 60
+
+    # Доставка изменений в 3x-ui через таблицу xui_outbox
+    outbox_batch_size: int = 100
+    outbox_poll_seconds: float = 1
+    outbox_backoff_base_seconds: float = 2
+    outbox_backoff_max_seconds: float = 600
+
+    # Сбор счетчиков трафика с панелей и срок хранения истории
+    traffic_interval_seconds: int = 300
+    traffic_retention_days: int = 90
+
+    # Деревья рефералов: глубина обхода и кэш сводок по рефереру
+    referral_tree_max_depth: int = 10
+    referral_tree_cache_ttl_seconds: int = 300
+    referral_tree_cache_size: int = 10000
+
+    # Счетчики /stats обновляются инкрементально и периодически сверяются с таблицами
+    stats_reconcile_minutes: int = 60
+    stats_signup_days: int = 7
+
+    # Как часто воркер пересылает новые чеки администратору
+    payment_check_interval_seconds: int = 5
+    pending_checks_limit: int = 50
+
+    # Размер страницы результатов /find
+    find_page_size: int = 10
+
+    tracing_enabled: bool = False
+    tracing_sample_rate: float = 1.0
+    tracing_file_path: str | None = "traces.jsonl"
+    tracing_otlp_endpoint: str | None = None
+
+    @property
+    def xui_pool(self) -> list[XuiServer]:
+        if self.xui_servers:
+            return self.xui_servers
+        return [
+            XuiServer(
+                name=DEFAULT_XUI_SERVER,
+                url_panel=self.xui_url_panel,
+                url_subscriptions=self.xui_url_subscriptions,
+                username=self.xui_username,
+                password=self.xui_password,
+                inbound_id=4,
+            )
+        ]
+
+    def xui_server(self, name: str | None) -> XuiServer:
+        pool = self.xui_pool
+        return next((server for server in pool if server.name == name), pool[0])
 
     @property
     def database_url(self) -> str:
         return f"postgresql+asyncpg://{self.database_user}:{self.database_password}@{self.database_host}:{self.database_port}/{self.database_name}"
 
+    @model_validator(mode="after")
+    def require_direct_url(self) -> "Settings":
+        # Через transaction pooling lock и unlock попадут на разные бэкенды, и лидерство утечет
+        if self.database_pgbouncer and not self.database_direct_url:
+            raise ValueError("DATABASE_DIRECT_URL is required when DATABASE_PGBOUNCER is enabled")
+        return self
+
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
 
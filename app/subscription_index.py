@@ -0,0 +1,97 @@
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import Iterable
+from typing import Any, NamedTuple
+
+ACTIVE = 1
+NOTIFY = 2
+
+
+class SubscriptionState(NamedTuple):
+    is_active: bool
+    is_notify: bool
+    amount: int
+
+
+class SubscriptionIndex:
+    """Компактный индекс состояния подписок в памяти процесса.
+
+    Снимок из базы хранится в отсортированном ``array('q')`` user_id с параллельными
+    массивами флагов и сумм (~13 байт на пользователя), поиск - бинарный. Изменения,
+    сделанные этим процессом после загрузки снимка, лежат в ``delta`` и побеждают его.
+    Изменения с других реплик приходят только с перезагрузкой, поэтому отсутствие
+    пользователя в индексе не означает, что его нет в базе.
+
+    Время изменений хранится ``settle`` секунд: пока реплика может их не видеть,
+    данные пользователя читаются из мастера (см. ``recently_changed``).
+    """
+
+    def __init__(self, settle: float = 0) -> None:
+        self.user_ids = array("q")
+        self.flags = bytearray()
+        self.amounts = array("i")
+        self.delta: dict[int, tuple[SubscriptionState, int]] = {}
+        self.version = 0
+        self.ready = False
+        self.settle = settle
+        # Пользователь -> время последнего изменения, по возрастанию времени
+        self.changed_at: OrderedDict[int, float] = OrderedDict()
+
+    def __contains__(self, user_id: int) -> bool:
+        return self.get(user_id) is not None
+
+    def get(self, user_id: int) -> SubscriptionState | None:
+        if not self.ready:
+            return None
+        if user_id in self.delta:
+            return self.delta[user_id][0]
+        position = bisect_left(self.user_ids, user_id)
+        if position == len(self.user_ids) or self.user_ids[position] != user_id:
+            return None
+        flags = self.flags[position]
+        return SubscriptionState(bool(flags & ACTIVE), bool(flags & NOTIFY), self.amounts[position])
+
+    def set(self, user_id: int, state: SubscriptionState) -> None:
+        self.version += 1
+        self.delta[user_id] = (state, self.version)
+        self._touch(user_id)
+
+    def update(self, user_id: int, **changes: Any) -> None:
+        # Неизвестных пользователей пропускаем - их подхватит следующая перезагрузка
+        state = self.get(user_id)
+        if state is not None:
+            self.set(user_id, state._replace(**changes))
+        else:
+            self._touch(user_id)
+
+    def recently_changed(self, user_id: int) -> bool:
+        """Изменялась ли подписка пользователя этим процессом за последние ``settle`` секунд."""
+        changed_at = self.changed_at.get(user_id)
+        return changed_at is not None and time.monotonic() - changed_at < self.settle
+
+    def extend(self, rows: Iterable[tuple[int, bool, bool, int]]) -> None:
+        """Дописывает в снимок строки ``(user_id, is_active, is_notify, amount)`` по возрастанию user_id."""
+        for user_id, is_active, is_notify, amount in rows:
+            self.user_ids.append(user_id)
+            self.flags.append((ACTIVE if is_active else 0) | (NOTIFY if is_notify else 0))
+            self.amounts.append(amount)
+
+    def _touch(self, user_id: int) -> None:
+        if not self.settle:
+            return
+        now = time.monotonic()
+        self.changed_at[user_id] = now
+        self.changed_at.move_to_end(user_id)
+        while self.changed_at:
+            oldest_user_id, changed_at = next(iter(self.changed_at.items()))
+            if now - changed_at < self.settle:
+                break
+            del self.changed_at[oldest_user_id]
+
+    def replace(self, snapshot: "SubscriptionIndex", started_version: int) -> None:
+        """Подменяет снимок; изменения после ``started_version`` могли в него не попасть и сохраняются."""
+        self.user_ids, self.flags, self.amounts = snapshot.user_ids, snapshot.flags, snapshot.amounts
+        self.delta = {user_id: entry for user_id, entry in self.delta.items() if entry[1] > started_version}
+        self.ready = True
@@ -0,0 +1,57 @@
+import logging
+from datetime import datetime
+
+from app import entities, metrics
+from app.adapters.postgresql.database import ReadDatabase
+from app.adapters.postgresql.repositories import UserRepository
+from app.adapters.telegram.sender import RateLimitedSender
+from app.lifecycle import Lifecycle
+from app.messages import BROADCAST_INTERRUPTED_MESSAGE, BROADCAST_SUCCESS_MESSAGE
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+async def broadcast(
+    sender: RateLimitedSender,
+    database: ReadDatabase,
+    lifecycle: Lifecycle,
+    audience: entities.Audience,
+    from_chat_id: int,
+    message_id: int,
+    total: int,
+) -> None:
+    """Копирует сообщение администратора получателям сегмента и присылает ему итог.
+
+    Получатели читаются страницами по возрастанию id, каждая страница - в своей
+    короткой сессии, так что соединение не держится открытым всю рассылку.
+    При остановке бота рассылка прерывается между отправками.
+    """
+    # Момент фиксируется, чтобы сегмент истекающих подписок не сдвигался за время рассылки
+    now = datetime.now()
+    after_id = None
+    sent = 0
+
+    with metrics.TASK_SECONDS.time(task="broadcast"):
+        while lifecycle.running:
+            async with database.session() as session:
+                user_ids = await UserRepository(session=session).find_audience_ids(
+                    audience, now=now, after_id=after_id, limit=settings.broadcast_batch_size
+                )
+            if not user_ids:
+                break
+
+            for user_id in user_ids:
+                if not lifecycle.running:
+                    break
+                try:
+                    if await sender.copy_message(user_id, from_chat_id, message_id):
+                        sent += 1
+                except Exception:
+                    # Логируем ошибку, но продолжаем рассылку
+                    logger.exception("Ошибка отправки сообщения пользователю %s", user_id)
+            after_id = user_ids[-1]
+
+    summary = BROADCAST_SUCCESS_MESSAGE if lifecycle.running else BROADCAST_INTERRUPTED_MESSAGE
+    logger.info("Broadcast to %s finished: %s of %s sent", audience, sent, total)
+    await sender.send_message(from_chat_id, summary.format(sent=sent, total=total), parse_mode=None)
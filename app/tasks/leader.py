@@ -0,0 +1,65 @@
+import asyncio
+import logging
+import zlib
+from collections.abc import Awaitable, Callable
+from contextlib import suppress
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.handlers.telegram.deps import get_database, get_lifecycle
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+Job = Callable[[], Awaitable[None]]
+
+
+def lock_key(name: str) -> int:
+    return zlib.crc32(f"brainsbot:{name}".encode())
+
+
+async def run_as_leader(name: str, job: Job) -> None:
+    """Запускает фоновую задачу только на одной реплике.
+
+    Реплика, получившая advisory lock в Postgres, выполняет задачу и держит соединение,
+    проверяя его heartbeat-запросом. При падении лидера Postgres снимает блокировку
+    вместе с соединением, и ее забирает одна из остальных реплик.
+    """
+    database = get_database()
+    lifecycle = get_lifecycle()
+    key = lock_key(name)
+
+    while lifecycle.running:
+        try:
+            # Блокировка живет в серверной сессии, поэтому соединение прямое, мимо pgbouncer
+            async with database.direct_engine.connect() as connection:
+                # Без транзакции, чтобы соединение не висело в состоянии idle in transaction
+                await connection.execution_options(isolation_level="AUTOCOMMIT")
+                acquired = await connection.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": key})
+                if acquired:
+                    logger.info("Acquired leadership for %s", name)
+                    await _lead(connection, name, key, job)
+        except Exception:
+            logger.exception("Leader job %s failed", name)
+
+        await lifecycle.sleep(settings.leader_retry_seconds)
+
+
+async def _lead(connection: AsyncConnection, name: str, key: int, job: Job) -> None:
+    task = asyncio.create_task(job(), name=f"leader:{name}")
+    try:
+        while not task.done():
+            await asyncio.wait({task}, timeout=settings.leader_heartbeat_seconds)
+            if not task.done():
+                # Если соединение потеряно, блокировка уже снята - останавливаем задачу
+                await asyncio.wait_for(connection.execute(text("SELECT 1")), settings.leader_heartbeat_seconds)
+        task.result()
+    finally:
+        if not task.done():
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+        with suppress(Exception):
+            await connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+        logger.info("Released leadership for %s", name)
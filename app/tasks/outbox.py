@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import entities, metrics
+from app.adapters.postgresql.repositories import OutboxRepository, PlacementRepository
+from app.adapters.postgresql.unit_of_work import UnitOfWork
+from app.adapters.xui.breaker import CircuitOpenError
+from app.adapters.xui.pool import XuiPool, xui_health_loop
+from app.handlers.telegram.deps import get_database, get_lifecycle
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def backoff(attempts: int) -> timedelta:
+    # Экспоненциальная задержка с разбросом, чтобы повторы не шли в панель одной волной
+    delay = min(settings.outbox_backoff_base_seconds * 2**attempts, settings.outbox_backoff_max_seconds)
+    return timedelta(seconds=delay * random.uniform(0.5, 1.5))
+
+
+async def deliver(xui_pool: XuiPool, server: str, outbox_message: entities.OutboxMessage) -> None:
+    if outbox_message.action != entities.OutboxAction.UPSERT_CLIENT:
+        raise ValueError(f"Unknown outbox action {outbox_message.action!r}")
+    user_uuid = str(outbox_message.user_id)
+    await xui_pool.client(server).upsert_client(user_uuid=user_uuid, email=user_uuid, end_date=outbox_message.end_date)
+
+
+async def place_clients(
+    placement_repository: PlacementRepository, xui_pool: XuiPool, user_ids: list[int]
+) -> dict[int, str]:
+    """Возвращает сервер каждого пользователя, размещая новых на наименее загруженные."""
+    servers = await placement_repository.find_servers(user_ids)
+    new_user_ids = [user_id for user_id in user_ids if user_id not in servers]
+    if new_user_ids:
+        counts = await placement_repository.count_by_server()
+        for user_id in new_user_ids:
+            server = xui_pool.choose(counts)
+            counts[server] = counts.get(server, 0) + 1
+            servers[user_id] = server
+        await placement_repository.add_many({user_id: servers[user_id] for user_id in new_user_ids})
+    return servers
+
+
+async def relay_outbox(session: AsyncSession, xui_pool: XuiPool) -> int:
+    outbox_repository = OutboxRepository(session=session)
+    placement_repository = PlacementRepository(session=session)
+    uow = UnitOfWork(session=session)
+    now = datetime.now()
+
+    outbox_messages = await outbox_repository.claim_due(now, limit=settings.outbox_batch_size)
+    if not outbox_messages:
+        return 0
+
+    # Срок абсолютный, поэтому из сообщений одного пользователя достаточно доставить последнее
+    latest: dict[int, entities.OutboxMessage] = {}
+    ids_by_user: dict[int, list[int]] = {}
+    for outbox_message in outbox_messages:
+        assert outbox_message.id is not None
+        latest[outbox_message.user_id] = outbox_message
+        ids_by_user.setdefault(outbox_message.user_id, []).append(outbox_message.id)
+
+    # Размещение фиксируется вместе с результатом доставки, повторы идут на тот же сервер
+    servers = await place_clients(placement_repository, xui_pool, list(latest))
+    results = await asyncio.gather(
+        *(deliver(xui_pool, servers[user_id], outbox_message) for user_id, outbox_message in latest.items()),
+        return_exceptions=True,
+    )
+    delivered_ids = []
+    delivered_user_ids = []
+    postponed_ids: dict[str, list[int]] = {}
+    for outbox_message, result in zip(latest.values(), results, strict=True):
+        ids = ids_by_user[outbox_message.user_id]
+        if isinstance(result, CircuitOpenError):
+            metrics.OUTBOX_DELIVERIES.inc(outcome="deferred")
+            postponed_ids.setdefault(servers[outbox_message.user_id], []).extend(ids)
+        elif isinstance(result, BaseException):
+            logger.warning("Outbox delivery for user %s failed: %r", outbox_message.user_id, result)
+            metrics.OUTBOX_DELIVERIES.inc(outcome="error")
+            await outbox_repository.schedule_retry(ids, now + backoff(outbox_message.attempts), repr(result))
+        else:
+            metrics.OUTBOX_DELIVERIES.inc(outcome="success")
+            delivered_ids.extend(ids)
+            delivered_user_ids.append(outbox_message.user_id)
+    await outbox_repository.mark_delivered(delivered_ids, now)
+    await outbox_repository.notify_changed(delivered_user_ids)
+    for server, ids in postponed_ids.items():
+        # Пока идет пробный запрос, retry_after нулевой - ждем не дольше его таймаута
+        delay = xui_pool.client(server).breaker.retry_after or settings.xui_request_timeout_seconds
+        await outbox_repository.postpone(ids, now + timedelta(seconds=delay))
+    await uow.commit()
+
+    return len(outbox_messages)
+
+
+async def outbox_relay_loop(xui_pool: XuiPool) -> None:
+    database = get_database()
+    lifecycle = get_lifecycle()
+    # Проверка здоровья идет там же, где доставка: предохранители живут в памяти процесса
+    health_task = asyncio.create_task(xui_health_loop(xui_pool))
+
+    try:
+        while lifecycle.running:
+            claimed = 0
+            try:
+                with metrics.TASK_SECONDS.time(task="outbox"):
+                    async with database.session() as session:
+                        claimed = await relay_outbox(session, xui_pool)
+            except Exception:
+                logger.exception("Outbox relay pass failed")
+
+            # Полная пачка - вероятно, есть еще, забираем сразу
+            if claimed < settings.outbox_batch_size:
+                await lifecycle.sleep(settings.outbox_poll_seconds)
+    finally:
+        health_task.cancel()
@@ -0,0 +1,81 @@
+import logging
+from datetime import datetime
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import entities, metrics
+from app.adapters.postgresql.repositories import PaymentCheckRepository
+from app.adapters.postgresql.unit_of_work import UnitOfWork
+from app.handlers.telegram.callbacks import pack
+from app.handlers.telegram.deps import get_database, get_lifecycle
+from app.messages import ButtonTexts, CallbackData, MessageTemplates
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+FORWARD_BATCH = 100
+# Лимит подписи к фото и документу в Telegram
+CAPTION_LIMIT = 1024
+
+
+def check_keyboard(check_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(
+                    text=ButtonTexts.CHECK_APPROVE, callback_data=pack(CallbackData.CHECK_APPROVE, check_id)
+                ),
+                InlineKeyboardButton(
+                    text=ButtonTexts.CHECK_REJECT, callback_data=pack(CallbackData.CHECK_REJECT, check_id)
+                ),
+            ]
+        ]
+    )
+
+
+async def forward_payment_checks(bot: Bot, session: AsyncSession) -> int:
+    payment_check_repository = PaymentCheckRepository(session=session)
+    uow = UnitOfWork(session=session)
+
+    payment_checks = await payment_check_repository.find_not_forwarded(limit=FORWARD_BATCH)
+    for payment_check in payment_checks:
+        assert payment_check.id is not None
+        caption = MessageTemplates.CHECK_INFO.format(username=payment_check.username, text=payment_check.text)
+        caption = caption[:CAPTION_LIMIT]
+        keyboard = check_keyboard(payment_check.id)
+        try:
+            if payment_check.file_type == entities.PaymentCheckFileType.PHOTO:
+                await bot.send_photo(
+                    settings.admin_id, payment_check.file_id, caption=caption, reply_markup=keyboard, parse_mode=None
+                )
+            else:
+                await bot.send_document(
+                    settings.admin_id, payment_check.file_id, caption=caption, reply_markup=keyboard, parse_mode=None
+                )
+        except TelegramBadRequest:
+            # Повтор не поможет, а чек первым в очереди заблокировал бы остальные. Он остается в статусе pending
+            # и виден администратору в /pending
+            logger.exception("Payment check %s can't be forwarded, skipping", payment_check.id)
+        # Фиксируем каждый чек сразу, чтобы сбой посреди пачки не привел к повторной пересылке
+        await payment_check_repository.mark_forwarded(payment_check.id, now=datetime.now())
+        await uow.commit()
+
+    return len(payment_checks)
+
+
+async def payment_check_loop(bot: Bot) -> None:
+    database = get_database()
+    lifecycle = get_lifecycle()
+
+    while lifecycle.running:
+        try:
+            with metrics.TASK_SECONDS.time(task="payment_checks"):
+                async with database.session() as session:
+                    await forward_payment_checks(bot, session)
+        except Exception:
+            logger.exception("Payment check forwarding failed")
+
+        await lifecycle.sleep(settings.payment_check_interval_seconds)
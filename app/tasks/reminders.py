@@ -0,0 +1,64 @@
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import entities, metrics
+from app.adapters.postgresql.repositories import ReminderRepository
+from app.adapters.postgresql.unit_of_work import UnitOfWork
+from app.adapters.telegram.sender import RateLimitedSender
+from app.handlers.telegram.deps import get_database, get_lifecycle
+from app.messages import SUBSCRIPTION_REMINDER_MESSAGE
+from app.settings import settings
+from app.tasks.subscriptions import payment_keyboard
+
+logger = logging.getLogger(__name__)
+
+
+async def send_reminders(sender: RateLimitedSender, session: AsyncSession, now: datetime) -> int:
+    reminder_repository = ReminderRepository(session=session)
+    uow = UnitOfWork(session=session)
+    keyboard = payment_keyboard()
+    sent = 0
+
+    # Окна не пересекаются: за 3 дня - (now+1d, now+3d], за 1 день - (now, now+1d]
+    window_start = now
+    for days_before in sorted(settings.reminder_days):
+        window_end = now + timedelta(days=days_before)
+        subscriptions = await reminder_repository.find_due(days_before, window_start, window_end)
+        # Отметка в sent_reminders защищает от повторной отправки, в том числе с других реплик
+        new_user_ids = set(
+            await reminder_repository.add_many(
+                [
+                    entities.SentReminder(user_id=subscription.user_id, days_before=days_before, end_date=end_date)
+                    for subscription in subscriptions
+                    if (end_date := subscription.end_date)
+                ]
+            )
+        )
+        await uow.commit()
+
+        for subscription in subscriptions:
+            if subscription.user_id not in new_user_ids or not subscription.end_date:
+                continue
+            text = SUBSCRIPTION_REMINDER_MESSAGE.format(end_date=subscription.end_date.strftime("%d.%m.%Y"))
+            if await sender.send_message(subscription.user_id, text, reply_markup=keyboard):
+                sent += 1
+        window_start = window_end
+
+    return sent
+
+
+async def reminder_loop(sender: RateLimitedSender) -> None:
+    database = get_database()
+    lifecycle = get_lifecycle()
+
+    while lifecycle.running:
+        try:
+            with metrics.TASK_SECONDS.time(task="reminders"):
+                async with database.session() as session:
+                    await send_reminders(sender, session, now=datetime.now())
+        except Exception:
+            logger.exception("Reminder pass failed")
+
+        await lifecycle.sleep(settings.reminder_interval_minutes * 60)
@@ -0,0 +1,49 @@
+import asyncio
+import heapq
+from collections.abc import Iterable
+from contextlib import suppress
+from datetime import datetime
+
+
+class DeadlineScheduler:
+    """Мин-куча ближайших дедлайнов ``(deadline, key)`` в пределах загруженного окна.
+
+    Окно ``[.., horizon_end]`` заполняется целиком через ``reset`` из запроса к базе,
+    а изменения внутри окна досылаются через ``schedule``. Устаревшие записи не
+    удаляются из кучи: потребитель перепроверяет их по базе при срабатывании.
+    """
+
+    def __init__(self) -> None:
+        self.heap: list[tuple[datetime, int]] = []
+        self.horizon_end = datetime.min
+        self.wakeup = asyncio.Event()
+
+    def reset(self, items: Iterable[tuple[datetime, int]], horizon_end: datetime) -> None:
+        self.heap = list(items)
+        heapq.heapify(self.heap)
+        self.horizon_end = horizon_end
+        self.wakeup.set()
+
+    def schedule(self, key: int, deadline: datetime | None) -> None:
+        # Дедлайны за пределами окна подхватит следующая загрузка
+        if deadline is None or deadline > self.horizon_end:
+            return
+        heapq.heappush(self.heap, (deadline, key))
+        if self.heap[0] == (deadline, key):
+            self.wakeup.set()
+
+    def pop_due(self, now: datetime) -> list[int]:
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due.append(heapq.heappop(self.heap)[1])
+        return due
+
+    async def wait(self) -> None:
+        """Спит до ближайшего дедлайна, конца окна или появления более раннего дедлайна."""
+        deadline = min(self.heap[0][0], self.horizon_end) if self.heap else self.horizon_end
+        timeout = (deadline - datetime.now()).total_seconds()
+        if timeout <= 0:
+            return
+        self.wakeup.clear()
+        with suppress(TimeoutError):
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
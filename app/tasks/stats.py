@@ -0,0 +1,51 @@
+import logging
+from datetime import date
+
+from app import metrics
+from app.adapters.postgresql.repositories import StatsRepository
+from app.adapters.postgresql.unit_of_work import UnitOfWork
+from app.handlers.telegram.deps import get_database, get_lifecycle, get_read_database
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+async def reconcile_stats() -> None:
+    """Пересчитывает счетчики /stats по исходным таблицам и исправляет накопленное расхождение.
+
+    Тяжелый пересчет идет на реплике, в одном снимке со счетчиками: инкременты пишутся в тех же
+    транзакциях, что и исходные данные, поэтому их разница в снимке и есть ошибка счетчиков.
+    В основную базу она уходит коротким инкрементом, а не перезаписью - обновления, сделанные
+    за время лага реплики и пересчета, не теряются, и пишущие транзакции не ждут сверку.
+    """
+    async with get_read_database().session() as session:
+        stats_repository = StatsRepository(session=session)
+        await stats_repository.snapshot()
+        counters, signups = await stats_repository.compute()
+        current_counters = await stats_repository.find_counters()
+        current_signups = dict(await stats_repository.find_signups(since=date.min))
+
+    counter_deltas = {name: value - current_counters.get(name, 0) for name, value in counters.items()}
+    signup_deltas = {day: -count for day, count in current_signups.items()}
+    for day, count in signups:
+        signup_deltas[day] = signup_deltas.get(day, 0) + count
+
+    async with get_database().session() as session:
+        stats_repository = StatsRepository(session=session)
+        await stats_repository.increment(counter_deltas)
+        await stats_repository.increment_signups(signup_deltas)
+        await UnitOfWork(session=session).commit()
+    logger.info("Stats reconciled: %s", {name: delta for name, delta in counter_deltas.items() if delta})
+
+
+async def stats_loop() -> None:
+    lifecycle = get_lifecycle()
+
+    while lifecycle.running:
+        try:
+            with metrics.TASK_SECONDS.time(task="stats"):
+                await reconcile_stats()
+        except Exception:
+            logger.exception("Stats reconciliation failed")
+
+        await lifecycle.sleep(settings.stats_reconcile_minutes * 60)
@@ -0,0 +1,44 @@
+import asyncio
+import logging
+from contextlib import suppress
+from typing import Any
+
+from sqlalchemy import text
+
+from app.adapters.postgresql.repositories import CLIENT_CHANGED_CHANNEL
+from app.adapters.xui.subscriptions import SubscriptionCache
+from app.handlers.telegram.deps import get_database
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+async def subscription_cache_listener(cache: SubscriptionCache) -> None:
+    """Сбрасывает записи кэша подписок по уведомлениям релея outbox со всех реплик."""
+    database = get_database()
+
+    def on_notification(*args: Any) -> None:
+        # asyncpg передает (connection, pid, channel, payload)
+        cache.invalidate(int(args[3]))
+
+    while True:
+        try:
+            async with database.direct_engine.connect() as connection:
+                await connection.execution_options(isolation_level="AUTOCOMMIT")
+                raw_connection = await connection.get_raw_connection()
+                driver_connection = raw_connection.driver_connection
+                await driver_connection.add_listener(CLIENT_CHANGED_CHANNEL, on_notification)
+                try:
+                    # Уведомления, пропущенные до подписки, уже не придут
+                    cache.clear()
+                    while True:
+                        await asyncio.sleep(settings.leader_heartbeat_seconds)
+                        await asyncio.wait_for(connection.execute(text("SELECT 1")), settings.leader_heartbeat_seconds)
+                finally:
+                    # Соединение вернется в пул - без подписки на канал
+                    with suppress(Exception):
+                        await driver_connection.remove_listener(CLIENT_CHANGED_CHANNEL, on_notification)
+        except Exception:
+            logger.exception("Subscription cache listener failed")
+
+        await asyncio.sleep(settings.leader_retry_seconds)
@@ -0,0 +1,38 @@
+import logging
+
+from app import metrics
+from app.adapters.postgresql.repositories import SubscriptionRepository
+from app.handlers.telegram.deps import get_database, get_lifecycle
+from app.settings import settings
+from app.subscription_index import SubscriptionIndex
+
+logger = logging.getLogger(__name__)
+
+LOAD_BATCH = 50_000
+
+
+async def reload_subscription_index(index: SubscriptionIndex) -> None:
+    started_version = index.version
+    snapshot = SubscriptionIndex()
+    async with get_database().session() as session:
+        subscription_repository = SubscriptionRepository(session=session)
+        after_user_id = None
+        # Keyset-пагинация: не держим курсор и не грузим ORM-объекты
+        while rows := await subscription_repository.find_states(after_user_id=after_user_id, limit=LOAD_BATCH):
+            snapshot.extend(rows)
+            after_user_id = rows[-1][0]
+    index.replace(snapshot, started_version)
+
+
+async def subscription_index_loop(index: SubscriptionIndex) -> None:
+    lifecycle = get_lifecycle()
+
+    while lifecycle.running:
+        try:
+            with metrics.TASK_SECONDS.time(task="subscription_index"):
+                await reload_subscription_index(index)
+            logger.info("Subscription index reloaded: %s users", len(index.user_ids))
+        except Exception:
+            logger.exception("Subscription index reload failed")
+
+        await lifecycle.sleep(settings.subscription_index_reload_seconds)
@@ -1,55 +1,104 @@
-import asyncio
-from dataclasses import replace
+import logging
+from datetime import datetime, timedelta
 
-from aiogram import Bot
-from aiogram.exceptions import TelegramForbiddenError
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-from vi_core.sqlalchemy import UnitOfWork
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.adapters.postgresql.repositories import SubscriptionRepository, UserRepository
-from app.handlers.telegram.deps import get_database
+from app import entities, metrics
+from app.adapters.postgresql.database import Database
+from app.adapters.postgresql.repositories import StatsRepository, SubscriptionRepository
+from app.adapters.postgresql.unit_of_work import UnitOfWork
+from app.adapters.telegram.sender import RateLimitedSender
+from app.handlers.telegram.deps import get_database, get_lifecycle, get_referral_trees, get_subscription_index
 from app.messages import SUBSCRIPTION_EXPIRED_MESSAGE, ButtonTexts, CallbackData, URLs
+from app.settings import settings
+from app.tasks.scheduler import DeadlineScheduler
 
+logger = logging.getLogger(__name__)
 
-async def monthly_check_loop(bot: Bot) -> None:
+EXPIRY_RETRY_SECONDS = 60
+
+
+def payment_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text=ButtonTexts.DONATE, url=URLs.PAYMENT_URL)],
+            [InlineKeyboardButton(text=ButtonTexts.SEND_CHECK, callback_data=CallbackData.SEND_CHECK)],
+            [InlineKeyboardButton(text=ButtonTexts.DISABLE_NOTIFICATIONS, callback_data=CallbackData.NOTIFICATIONS)],
+        ]
+    )
+
+
+async def expire_subscriptions(sender: RateLimitedSender, session: AsyncSession, user_ids: list[int]) -> int:
+    subscription_repository = SubscriptionRepository(session=session)
+    stats_repository = StatsRepository(session=session)
+    uow = UnitOfWork(session=session)
+
+    # Отключение меняет и цены рефереров, поэтому выручку считаем как разницу до и после
+    revenue_before = await stats_repository.revenue(user_ids)
+    # Подписки, продленные после попадания в расписание, база отфильтрует сама
+    expired_amounts = await subscription_repository.deactivate_expired(user_ids, now=datetime.now())
+    revenue = await stats_repository.revenue(user_ids)
+    await stats_repository.increment(
+        {
+            entities.StatsCounter.ACTIVE_SUBSCRIPTIONS: -len(expired_amounts),
+            entities.StatsCounter.MONTHLY_REVENUE: revenue - revenue_before,
+        }
+    )
+    await uow.commit()
+    expired_user_ids = list(expired_amounts)
+
+    subscription_index = get_subscription_index()
+    for user_id in expired_user_ids:
+        subscription_index.update(user_id, is_active=False)
+    get_referral_trees().invalidate(expired_user_ids)
+
+    keyboard = payment_keyboard()
+    for user_id in expired_user_ids:
+        await sender.send_message(user_id, SUBSCRIPTION_EXPIRED_MESSAGE, reply_markup=keyboard)
+
+    return len(expired_user_ids)
+
+
+async def check_expired_subscriptions(sender: RateLimitedSender, session: AsyncSession) -> int:
+    """Разовая проверка: деактивирует все уже истекшие активные подписки."""
+    subscriptions = await SubscriptionRepository(session=session).find_expiring(until=datetime.now())
+    return await expire_subscriptions(sender, session, [subscription.user_id for subscription in subscriptions])
+
+
+async def expiry_loop(sender: RateLimitedSender, scheduler: DeadlineScheduler) -> None:
     database = get_database()
+    lifecycle = get_lifecycle()
+    horizon = timedelta(minutes=settings.expiry_horizon_minutes)
 
-    while True:
+    while lifecycle.running:
+        try:
+            await _expiry_pass(sender, scheduler, database, horizon)
+        except Exception:
+            logger.exception("Expiry pass failed")
+            # Сбрасываем окно, чтобы следующая итерация перечитала расписание из базы
+            scheduler.horizon_end = datetime.min
+            await lifecycle.sleep(EXPIRY_RETRY_SECONDS)
+            continue
+
+        await lifecycle.interruptible(scheduler.wait())
+
+
+async def _expiry_pass(
+    sender: RateLimitedSender, scheduler: DeadlineScheduler, database: Database, horizon: timedelta
+) -> None:
+    now = datetime.now()
+    if now >= scheduler.horizon_end:
+        # Загружаем окно ближайших истечений, включая пропущенные за время простоя
         async with database.session() as session:
-            subscription_repository = SubscriptionRepository(session=session)
-            user_repository = UserRepository(session=session)
-            uow = UnitOfWork(session=session)
-
-            subscriptions = await subscription_repository.find_all_expired()
-
-            for subscription in subscriptions:
-                # Деактивируем подписку
-                new_subscription = replace(subscription, is_active=False)
-                await subscription_repository.edit_one(new_subscription)
-
-                # Отправляем уведомление пользователю
-                user = await user_repository.find_one(id=subscription.user_id)
-                if user is None:
-                    continue
-
-                keyboard = InlineKeyboardMarkup(
-                    inline_keyboard=[
-                        [InlineKeyboardButton(text=ButtonTexts.DONATE, url=URLs.PAYMENT_URL)],
-                        [InlineKeyboardButton(text=ButtonTexts.SEND_CHECK, callback_data=CallbackData.SEND_CHECK)],
-                        [
-                            InlineKeyboardButton(
-                                text=ButtonTexts.DISABLE_NOTIFICATIONS, callback_data=CallbackData.NOTIFICATIONS
-                            )
-                        ],
-                    ]
-                )
-                try:
-                    await bot.send_message(user.id, SUBSCRIPTION_EXPIRED_MESSAGE, reply_markup=keyboard)
-                except TelegramForbiddenError:
-                    # Пользователь заблокировал бота - пропускаем
-                    print(f"User {user.id} has blocked the bot")
-                    continue
-
-            await uow.commit()
-
-        await asyncio.sleep(86400)  # Проверка раз в день
+            subscriptions = await SubscriptionRepository(session=session).find_expiring(until=now + horizon)
+        scheduler.reset(
+            ((subscription.end_date, subscription.user_id) for subscription in subscriptions if subscription.end_date),
+            horizon_end=now + horizon,
+        )
+
+    due = scheduler.pop_due(now)
+    if due:
+        with metrics.TASK_SECONDS.time(task="expiry"):
+            async with database.session() as session:
+                await expire_subscriptions(sender, session, due)
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import entities, metrics
+from app.adapters.postgresql.repositories import TrafficRepository
+from app.adapters.postgresql.unit_of_work import UnitOfWork
+from app.adapters.xui.pool import XuiPool
+from app.handlers.telegram.deps import get_database, get_lifecycle
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+async def collect_traffic(xui_pool: XuiPool) -> list[entities.TrafficUsage]:
+    """Один запрос на инбаунд каждого сервера; недоступные серверы пропускаются до следующего прохода."""
+    names = list(xui_pool.servers)
+    results = await asyncio.gather(
+        *(xui_pool.client(name).client_traffic() for name in names),
+        return_exceptions=True,
+    )
+    usages = []
+    for name, result in zip(names, results, strict=True):
+        if isinstance(result, BaseException):
+            logger.warning("Traffic collection from %s failed: %r", name, result)
+            continue
+        for direction in ("up", "down"):
+            total = sum(getattr(usage, direction) for usage in result)
+            metrics.XUI_SERVER_TRAFFIC_BYTES.set(total, server=name, direction=direction)
+        usages.extend(result)
+    return usages
+
+
+async def ingest_traffic(session: AsyncSession, xui_pool: XuiPool) -> int:
+    traffic_repository = TrafficRepository(session=session)
+    uow = UnitOfWork(session=session)
+
+    usages = await collect_traffic(xui_pool)
+    await traffic_repository.add_samples(usages)
+    await traffic_repository.upsert_latest(usages)
+    await traffic_repository.delete_samples_before(datetime.now() - timedelta(days=settings.traffic_retention_days))
+    await uow.commit()
+
+    return len(usages)
+
+
+async def traffic_loop(xui_pool: XuiPool) -> None:
+    database = get_database()
+    lifecycle = get_lifecycle()
+
+    while lifecycle.running:
+        try:
+            with metrics.TASK_SECONDS.time(task="traffic"):
+                async with database.session() as session:
+                    ingested = await ingest_traffic(session, xui_pool)
+            logger.info("Traffic samples ingested: %s", ingested)
+        except Exception:
+            logger.exception("Traffic ingestion failed")
+
+        await lifecycle.sleep(settings.traffic_interval_seconds)
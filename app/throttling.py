@@ -0,0 +1,33 @@
+import time
+
+
+class TokenBuckets:
+    """Корзины токенов по ключу ``(user_id, handler)`` в памяти процесса.
+
+    Корзина хранится одним числом - моментом, когда она снова станет полной
+    (как в GCRA): токенов в ней ``burst - (full_at - now) * rate``. Полная
+    корзина неотличима от новой, поэтому при периодической чистке такие записи
+    выбрасываются и память занимают только пользователи, активные прямо сейчас.
+    """
+
+    def __init__(self, sweep_interval: float = 60) -> None:
+        self.full_at: dict[tuple[int, str], float] = {}
+        self.sweep_interval = sweep_interval
+        self.swept_at = time.monotonic()
+
+    def allow(self, user_id: int, handler: str, rate: float, burst: int) -> bool:
+        now = time.monotonic()
+        if now - self.swept_at >= self.sweep_interval:
+            self.sweep(now)
+
+        key = (user_id, handler)
+        full_at = max(self.full_at.get(key, now), now)
+        # Списание токена сдвигает момент заполнения на 1 / rate
+        if full_at + 1 / rate - now > burst / rate:
+            return False
+        self.full_at[key] = full_at + 1 / rate
+        return True
+
+    def sweep(self, now: float) -> None:
+        self.swept_at = now
+        self.full_at = {key: full_at for key, full_at in self.full_at.items() if full_at > now}
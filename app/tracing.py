@@ -0,0 +1,209 @@
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import random
+import secrets
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager, suppress
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, TypeVar
+
+import aiohttp
+
+T = TypeVar("T")
+
+SERVICE_NAME = "brainsbot"
+MAX_BUFFERED_SPANS = 10_000
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None = None
+    sampled: bool = True
+    attributes: dict[str, Any] = field(default_factory=dict)
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: int | None = None
+    error: str | None = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": ((self.end_ns or self.start_ns) - self.start_ns) / 1_000_000,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+    def to_otlp(self) -> dict[str, Any]:
+        otlp: dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [
+                {"key": key, "value": {"stringValue": str(value)}} for key, value in self.attributes.items()
+            ],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            otlp["parentSpanId"] = self.parent_id
+        return otlp
+
+
+class Tracer:
+    """Собирает завершенные спаны в буфер и периодически выгружает их в файл или OTLP коллектор."""
+
+    def __init__(
+        self,
+        sample_rate: float = 1.0,
+        file_path: str | None = None,
+        otlp_endpoint: str | None = None,
+        flush_interval: float = 5.0,
+    ) -> None:
+        self.sample_rate = sample_rate
+        self.file_path = file_path
+        self.otlp_endpoint = otlp_endpoint
+        self.flush_interval = flush_interval
+        self.buffer: list[Span] = []
+        self.dropped = 0
+        self._task: asyncio.Task[None] | None = None
+
+    def record(self, span: Span) -> None:
+        if len(self.buffer) >= MAX_BUFFERED_SPANS:
+            self.dropped += 1
+            return
+        self.buffer.append(span)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def shutdown(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+        await self.flush()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to export spans")
+
+    async def flush(self) -> None:
+        spans, self.buffer = self.buffer, []
+        if not spans:
+            return
+        if self.file_path:
+            await asyncio.to_thread(self._write_file, spans)
+        if self.otlp_endpoint:
+            await self._send_otlp(spans)
+
+    def _write_file(self, spans: list[Span]) -> None:
+        assert self.file_path
+        with open(self.file_path, "a", encoding="utf-8") as file:
+            file.writelines(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n" for span in spans)
+
+    async def _send_otlp(self, spans: list[Span]) -> None:
+        assert self.otlp_endpoint
+        payload = {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                    "scopeSpans": [{"scope": {"name": SERVICE_NAME}, "spans": [span.to_otlp() for span in spans]}],
+                }
+            ]
+        }
+        async with aiohttp.ClientSession() as session:
+            async with session.post(self.otlp_endpoint, json=payload) as response:
+                response.raise_for_status()
+
+
+# None означает, что трассировка выключена: обертки сразу вызывают исходную функцию
+tracer: Tracer | None = None
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def setup(
+    sample_rate: float = 1.0,
+    file_path: str | None = None,
+    otlp_endpoint: str | None = None,
+) -> Tracer:
+    global tracer
+    tracer = Tracer(sample_rate=sample_rate, file_path=file_path, otlp_endpoint=otlp_endpoint)
+    tracer.start()
+    return tracer
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span | None]:
+    active = tracer
+    if active is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    if parent is None:
+        sampled = random.random() < active.sample_rate
+        current = Span(name=name, trace_id=secrets.token_hex(16), span_id=secrets.token_hex(8), sampled=sampled)
+    elif not parent.sampled:
+        # Решение о сэмплировании принимается на корневом спане и наследуется
+        yield None
+        return
+    else:
+        current = Span(name=name, trace_id=parent.trace_id, span_id=secrets.token_hex(8), parent_id=parent.span_id)
+
+    current.attributes.update(attributes)
+    token = _current_span.set(current)
+    try:
+        yield current if current.sampled else None
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end_ns = time.time_ns()
+        if current.sampled:
+            active.record(current)
+
+
+def traced(cls: type[T]) -> type[T]:
+    """Оборачивает публичные корутины класса (и ``__call__`` юзкейсов) в спаны."""
+    for name, function in inspect.getmembers(cls, inspect.iscoroutinefunction):
+        if name.startswith("_") and name != "__call__":
+            continue
+        span_name = cls.__name__ if name == "__call__" else f"{cls.__name__}.{name}"
+        setattr(cls, name, _traced(span_name, function))
+    return cls
+
+
+def _traced(name: str, function: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(function)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if tracer is None:
+            return await function(*args, **kwargs)
+        with span(name):
+            return await function(*args, **kwargs)
+
+    return wrapper
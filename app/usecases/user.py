@@ -1,34 +1,67 @@
-
-from dataclasses import dataclass, replace
-from datetime import datetime, timedelta
+import logging
+from collections import Counter
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta
 
 from aiogram import types
 from aiogram.fsm.context import FSMContext
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-from vi_core.sqlalchemy import UnitOfWork
 
-from app import entities, messages
+from app import entities, messages, tracing
 from app.adapters.postgresql import repositories
-from app.adapters.xui.client import XuiClient
+from app.adapters.postgresql.database import ReadDatabase
+from app.adapters.postgresql.unit_of_work import UnitOfWork
+from app.adapters.telegram.sender import RateLimitedSender
+from app.handlers.telegram.callbacks import pack
+from app.lifecycle import Lifecycle
+from app.referral_trees import ReferralTreeCache
 from app.settings import settings
+from app.subscription_index import SubscriptionIndex, SubscriptionState
+from app.tasks.broadcast import broadcast
+from app.tasks.scheduler import DeadlineScheduler
 
 DAYS_IN_MONTH = 30
 
+logger = logging.getLogger(__name__)
+
+
+def _parse_referrer_id(text: str | None) -> int | None:
+    _, _, payload = (text or "").partition(" ")
+    if not payload.startswith("ref_"):
+        return None
+    try:
+        return int(payload[4:])
+    except ValueError:
+        return None
+
+
+async def _find_referral_tree(
+    referral_repository: repositories.ReferralRepository, referral_trees: ReferralTreeCache, referrer_id: int
+) -> entities.ReferralTree:
+    tree = referral_trees.get(referrer_id)
+    if tree is None:
+        tree = await referral_repository.find_tree(referrer_id, max_depth=settings.referral_tree_max_depth)
+        referral_trees.set(tree)
+    return tree
+
 
+@tracing.traced
 @dataclass
 class StartUserUsecase:
     user_repository: repositories.UserRepository
     uow: UnitOfWork
-    subscription_repository: repositories.SubscriptionRepository
-    referral_repository: repositories.ReferralRepository
-    xui_client: XuiClient
+    outbox_repository: repositories.OutboxRepository
+    stats_repository: repositories.StatsRepository
+    expiry_scheduler: DeadlineScheduler
+    subscription_index: SubscriptionIndex
+    referral_trees: ReferralTreeCache
 
     async def __call__(self, message: types.Message, state: FSMContext) -> None:
         if not message.from_user:
             return
 
-        user = await self.user_repository.find_one(id=message.from_user.id)
-        if not user:
+        # Известных индексу пользователей не трогаем; при промахе вставка идемпотентна
+        if message.from_user.id not in self.subscription_index:
             new_user = entities.User(
                 id=message.from_user.id,
                 first_name=message.from_user.first_name,
@@ -36,27 +69,48 @@ class StartUserUsecase:
                 username=message.from_user.username or "",
                 language_code=message.from_user.language_code or "",
             )
-
             new_subscription = entities.Subscription(user_id=new_user.id)
 
-            await self.xui_client.add_client(email=str(message.from_user.id), user_uuid=str(new_user.id), days=3)
-            await self.user_repository.add_one(new_user)
-            await self.subscription_repository.add_one(new_subscription)
-
-            if message.text:
-                referrer_id = message.text.split(" ", 1)
-                if len(referrer_id) > 1 and referrer_id[1].startswith("ref_"):
-                    referrer_id_int = int(referrer_id[1][4:])
-                    referrer = await self.user_repository.find_one(id=referrer_id_int)
-                    if referrer:
-                        new_referral = entities.Referral(
-                            referrer_id=referrer_id_int,
-                            referral_id=new_user.id,
+            referrer_id = _parse_referrer_id(message.text)
+            # Новый реферал меняет скидку реферера, поэтому выручку считаем как разницу до и после регистрации
+            revenue_user_ids = [new_user.id] if referrer_id is None else [new_user.id, referrer_id]
+            revenue_before = await self.stats_repository.revenue(revenue_user_ids)
+            created, referral_created = await self.user_repository.register(
+                new_user, new_subscription, referrer_id=referrer_id
+            )
+            if created:
+                revenue = await self.stats_repository.revenue(revenue_user_ids)
+                await self.stats_repository.increment(
+                    {
+                        entities.StatsCounter.USERS: 1,
+                        entities.StatsCounter.ACTIVE_SUBSCRIPTIONS: int(new_subscription.is_active),
+                        entities.StatsCounter.MONTHLY_REVENUE: revenue - revenue_before,
+                        entities.StatsCounter.REFERRALS: int(referral_created),
+                    }
+                )
+                await self.stats_repository.add_signup(date.today())
+            if created and new_subscription.end_date:
+                # Клиента в панели создаст релей outbox, в той же транзакции, что и пользователя
+                await self.outbox_repository.add_many(
+                    [
+                        entities.OutboxMessage(
+                            idempotency_key=f"signup:{new_user.id}",
+                            user_id=new_user.id,
+                            end_date=new_subscription.end_date,
                         )
-                        await self.referral_repository.add_one(new_referral)
-
+                    ]
+                )
             await self.uow.commit()
 
+            if created:
+                if referrer_id is not None:
+                    self.referral_trees.invalidate([referrer_id])
+                self.expiry_scheduler.schedule(new_subscription.user_id, new_subscription.end_date)
+                self.subscription_index.set(
+                    new_subscription.user_id,
+                    SubscriptionState(new_subscription.is_active, new_subscription.is_notify, new_subscription.amount),
+                )
+
         keyboard = InlineKeyboardMarkup(
             inline_keyboard=[
                 [
@@ -87,10 +141,13 @@ class StartUserUsecase:
         await state.clear()
 
 
+@tracing.traced
 @dataclass
 class AccountUsecase:
     user_repository: repositories.UserRepository
     uow: UnitOfWork
+    placement_repository: repositories.PlacementRepository
+    traffic_repository: repositories.TrafficRepository
 
     async def __call__(self, callback_query: types.CallbackQuery) -> None:
         if not callback_query.message:
@@ -118,17 +175,31 @@ class AccountUsecase:
         else:
             end_date = messages.StatusMessages.SUBSCRIPTION_NO_END_DATE
 
+        # Счетчики из последнего сбора с панели, без запроса к ней
+        usage = await self.traffic_repository.find_latest(user.id)
+        if usage:
+            traffic = messages.MessageTemplates.TRAFFIC_FORMAT.format(up=usage.up / 2**30, down=usage.down / 2**30)
+        else:
+            traffic = messages.StatusMessages.TRAFFIC_UNKNOWN
+
         message = messages.ACCOUNT_TEXT.format(
             username=callback_query.from_user.first_name,
             subscription_status=subscription_status,
             end_date=end_date,
+            traffic=traffic,
         )
+        if settings.subscription_proxy_url:
+            subscription_url = f"{settings.subscription_proxy_url}/sub/{user.id}"
+        else:
+            # Ссылка на подписку ведет на сервер, где размещен клиент
+            server = settings.xui_server(await self.placement_repository.find_server(user.id))
+            subscription_url = f"{server.url_subscriptions}/{user.id}"
         keyboard = InlineKeyboardMarkup(
             inline_keyboard=[
                 [
                     InlineKeyboardButton(
                         text="Показать подписку",
-                        url=f"{settings.xui_url_subscriptions}/{user.id}",
+                        url=subscription_url,
                     ),
                 ]
             ]
@@ -136,10 +207,12 @@ class AccountUsecase:
         await callback_query.message.answer(message, reply_markup=keyboard)
 
 
+@tracing.traced
 @dataclass
 class ReferralUsecase:
     user_repository: repositories.UserRepository
     referral_repository: repositories.ReferralRepository
+    referral_trees: ReferralTreeCache
 
     async def __call__(self, callback_query: types.CallbackQuery) -> None:
         if not callback_query.message:
@@ -152,24 +225,28 @@ class ReferralUsecase:
             # Безопасно форматируем имя пользователя и username
             first_name = referral.referral.first_name or "Пользователь"
 
-            status = (messages.StatusMessages.SUBSCRIPTION_ACTIVE
-                     if referral.referral.subscription.is_active
-                     else messages.StatusMessages.SUBSCRIPTION_INACTIVE)
+            status = (
+                messages.StatusMessages.SUBSCRIPTION_ACTIVE
+                if referral.referral.subscription.is_active
+                else messages.StatusMessages.SUBSCRIPTION_INACTIVE
+            )
 
             referral_text += f"{first_name}{messages.Constants.SUBSCRIPTION_SEPARATOR}{status}\n"
 
-        count_active_refferal = await self.referral_repository.count_all_active_referral(
-            referrer_id=callback_query.from_user.id
-        )
+        tree = await _find_referral_tree(self.referral_repository, self.referral_trees, callback_query.from_user.id)
         await callback_query.message.answer(
             messages.REFERRAL_TEXT.format(
                 referrals=referral_text,
                 referral_link=callback_query.from_user.id,
-                discount=entities.DISCOUNT * count_active_refferal,
+                discount=entities.DISCOUNT * tree.active_direct,
+                descendants=tree.descendants,
+                active_descendants=tree.active_descendants,
+                depth=tree.depth,
             ),
         )
 
 
+@tracing.traced
 @dataclass
 class InstructionsUsecase:
     async def __call__(self, callback_query: types.CallbackQuery) -> None:
@@ -198,105 +275,332 @@ class InstructionsUsecase:
         await callback_query.message.answer(messages.INSTRUCTIONS_TEXT, reply_markup=keyboard)
 
 
+@tracing.traced
 @dataclass
 class NotificationsUsecase:
-    user_repository: repositories.UserRepository
     uow: UnitOfWork
     subscription_repository: repositories.SubscriptionRepository
+    subscription_index: SubscriptionIndex
 
     async def __call__(self, callback_query: types.CallbackQuery) -> None:
         if not callback_query.message:
             return
 
-        user = await self.user_repository.find_one(id=callback_query.from_user.id)
-        if not user or not user.subscription:
-            return
-
-        if not user.subscription.is_active:
+        # Переключаем одним UPDATE: индекс может отставать от других реплик, а запись все равно нужна
+        subscription = await self.subscription_repository.toggle_notify(callback_query.from_user.id)
+        if not subscription:
             await callback_query.message.answer(messages.ActionRequiredMessages.NOTIFICATIONS_ACTIVATION_REQUIRED)
             return
+        await self.uow.commit()
+        self.subscription_index.update(subscription.user_id, is_notify=subscription.is_notify)
 
-        if user.subscription.is_notify:
-            updated_subscription = replace(user.subscription, is_notify=False)
-            await callback_query.message.answer(messages.StatusMessages.NOTIFICATIONS_DISABLED)
-        else:
-            updated_subscription = replace(user.subscription, is_notify=True)
+        if subscription.is_notify:
             await callback_query.message.answer(messages.StatusMessages.NOTIFICATIONS_ENABLED)
-
-        await self.subscription_repository.edit_one(updated_subscription)
-        await self.uow.commit()
+        else:
+            await callback_query.message.answer(messages.StatusMessages.NOTIFICATIONS_DISABLED)
 
 
+@tracing.traced
 @dataclass
 class SendMessageCheckUsecase:
-    user_repository: repositories.UserRepository
     uow: UnitOfWork
-    subscription_repository: repositories.SubscriptionRepository
-    xui_client: XuiClient
+    payment_check_repository: repositories.PaymentCheckRepository
 
     async def __call__(self, message: types.Message, state: FSMContext) -> None:
-        if not message.from_user or not message.bot:
+        if not message.from_user:
             return
 
-        text = message.text or message.caption or messages.Constants.NO_TEXT_PLACEHOLDER
+        if message.photo:
+            file_id, file_type = message.photo[-1].file_id, entities.PaymentCheckFileType.PHOTO
+        elif message.document:
+            file_id, file_type = message.document.file_id, entities.PaymentCheckFileType.DOCUMENT
+        else:
+            await message.answer(messages.StatusMessages.ONLY_PHOTO_OR_DOCUMENT)
+            return
 
-        check_message = messages.MessageTemplates.CHECK_INFO.format(
+        # Администратору чек перешлет фоновый воркер, подписка продлится после подтверждения
+        payment_check = entities.PaymentCheck(
+            user_id=message.from_user.id,
             username=message.from_user.username or str(message.from_user.id),
-            text=text
+            file_id=file_id,
+            file_type=file_type,
+            text=message.text or message.caption or messages.Constants.NO_TEXT_PLACEHOLDER,
         )
+        await self.payment_check_repository.add_one(payment_check)
+        await self.uow.commit()
 
-        if message.photo:
-            photo = message.photo[-1]
-            await message.bot.send_photo(
-                settings.admin_id,
-                photo.file_id,
-                caption=check_message,
-                parse_mode=None,
+        await state.clear()
+        await message.answer(messages.StatusMessages.MESSAGE_SENT)
+
+
+@tracing.traced
+@dataclass
+class PendingPaymentChecksUsecase:
+    payment_check_repository: repositories.PaymentCheckRepository
+
+    async def __call__(self, message: types.Message) -> None:
+        if not message.from_user or message.from_user.id != settings.admin_id:
+            return
+
+        payment_checks = await self.payment_check_repository.find_pending(limit=settings.pending_checks_limit)
+        if not payment_checks:
+            await message.answer(messages.NO_PENDING_CHECKS_MESSAGE, parse_mode=None)
+            return
+
+        checks = "\n".join(
+            messages.MessageTemplates.PENDING_CHECK_FORMAT.format(
+                id=payment_check.id,
+                username=payment_check.username,
+                date=payment_check.created_at.strftime("%d.%m.%Y %H:%M"),
+                text=payment_check.text,
             )
-        elif message.document:
-            await message.bot.send_document(
-                settings.admin_id,
-                message.document.file_id,
-                caption=check_message,
-                parse_mode=None,
+            for payment_check in payment_checks
+        )
+        # Подтверждаются только показанные чеки: пришедшие позже получат id больше последнего
+        keyboard = InlineKeyboardMarkup(
+            inline_keyboard=[
+                [
+                    InlineKeyboardButton(
+                        text=messages.ButtonTexts.CHECK_APPROVE_ALL,
+                        callback_data=pack(messages.CallbackData.CHECK_APPROVE_ALL, payment_checks[-1].id),
+                    )
+                ]
+            ]
+        )
+        await message.answer(
+            messages.PENDING_CHECKS_MESSAGE.format(count=len(payment_checks), checks=checks),
+            reply_markup=keyboard,
+            parse_mode=None,
+        )
+
+
+@tracing.traced
+@dataclass
+class StatsUsecase:
+    stats_repository: repositories.StatsRepository
+
+    async def __call__(self, message: types.Message) -> None:
+        if not message.from_user or message.from_user.id != settings.admin_id:
+            return
+
+        # Счетчики поддерживаются при записи, так что ответ не зависит от размера таблиц
+        counters = await self.stats_repository.find_counters()
+        today = date.today()
+        since = today - timedelta(days=settings.stats_signup_days - 1)
+        signups = dict(await self.stats_repository.find_signups(since))
+
+        days = (today - timedelta(days=offset) for offset in range(settings.stats_signup_days))
+        await message.answer(
+            messages.STATS_TEXT.format(
+                **{counter: counters.get(counter, 0) for counter in entities.StatsCounter},
+                days=settings.stats_signup_days,
+                signups="".join(
+                    messages.MessageTemplates.SIGNUPS_DAY_FORMAT.format(
+                        date=day.strftime("%d.%m.%Y"), count=signups.get(day, 0)
+                    )
+                    for day in days
+                ),
             )
-        else:
-            await message.answer(messages.StatusMessages.ONLY_PHOTO_OR_DOCUMENT)
+        )
+
+
+async def _find_users_page(
+    user_repository: repositories.UserRepository, query: str, page: int
+) -> tuple[str, InlineKeyboardMarkup | None]:
+    # Лишняя запись показывает, есть ли следующая страница, без отдельного COUNT
+    users = await user_repository.search(
+        query, limit=settings.find_page_size + 1, offset=page * settings.find_page_size
+    )
+    if not users:
+        return messages.FIND_NO_RESULTS_MESSAGE.format(query=query), None
+
+    lines = []
+    for found_user in users[: settings.find_page_size]:
+        subscription = found_user.subscription
+        is_active = subscription is not None and subscription.is_active
+        end_date = subscription.end_date if subscription else None
+        lines.append(
+            messages.MessageTemplates.FOUND_USER_FORMAT.format(
+                id=found_user.id,
+                first_name=found_user.first_name,
+                username=found_user.username,
+                status=messages.StatusMessages.SUBSCRIPTION_ACTIVE
+                if is_active
+                else messages.StatusMessages.SUBSCRIPTION_INACTIVE,
+                end_date=end_date.strftime("%d.%m.%Y") if end_date else "-",
+            )
+        )
+
+    buttons = []
+    if page > 0:
+        buttons.append(
+            InlineKeyboardButton(
+                text=messages.ButtonTexts.PREVIOUS_PAGE, callback_data=pack(messages.CallbackData.FIND_PAGE, page - 1)
+            )
+        )
+    if len(users) > settings.find_page_size:
+        buttons.append(
+            InlineKeyboardButton(
+                text=messages.ButtonTexts.NEXT_PAGE, callback_data=pack(messages.CallbackData.FIND_PAGE, page + 1)
+            )
+        )
+    text = messages.FIND_RESULTS_MESSAGE.format(query=query, page=page + 1, users="\n".join(lines))
+    return text, InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
+
+
+@tracing.traced
+@dataclass
+class FindUsersUsecase:
+    user_repository: repositories.UserRepository
+
+    async def __call__(self, message: types.Message, state: FSMContext, query: str | None) -> None:
+        if not message.from_user or message.from_user.id != settings.admin_id:
             return
 
-        await state.clear()
+        query = (query or "").strip()
+        if not query:
+            await message.answer(messages.FIND_USAGE_MESSAGE, parse_mode=None)
+            return
 
-        subscription = await self.subscription_repository.find_one(user_id=message.from_user.id)
-        if not subscription:
+        # Запрос может не влезть в 64 байта callback_data, поэтому для листания он лежит в FSM
+        await state.update_data(find_query=query)
+        text, keyboard = await _find_users_page(self.user_repository, query, page=0)
+        await message.answer(text, reply_markup=keyboard, parse_mode=None)
+
+
+@tracing.traced
+@dataclass
+class FindUsersPageUsecase:
+    user_repository: repositories.UserRepository
+
+    async def __call__(self, callback_query: types.CallbackQuery, state: FSMContext, page: int) -> None:
+        if not isinstance(callback_query.message, types.Message):
+            return
+        if callback_query.from_user.id != settings.admin_id:
             return
 
-        days = DAYS_IN_MONTH + (subscription.end_date - datetime.now()).days
-        await self.xui_client.update_client(user_uuid=str(message.from_user.id), email=str(message.from_user.id), days=days)
-        updated_subscription = replace(
-            subscription,
-            end_date=datetime.now() + timedelta(days=DAYS_IN_MONTH)
-            if not subscription.end_date
-            else subscription.end_date + timedelta(days=DAYS_IN_MONTH),
-            is_notify=True,
-            is_active=True,
+        query = (await state.get_data()).get("find_query")
+        if not query:
+            await callback_query.message.answer(messages.FIND_USAGE_MESSAGE, parse_mode=None)
+            return
+
+        text, keyboard = await _find_users_page(self.user_repository, query, page=max(page, 0))
+        await callback_query.message.edit_text(text, reply_markup=keyboard, parse_mode=None)
+
+
+@tracing.traced
+@dataclass
+class ApprovePaymentChecksUsecase:
+    uow: UnitOfWork
+    payment_check_repository: repositories.PaymentCheckRepository
+    subscription_repository: repositories.SubscriptionRepository
+    outbox_repository: repositories.OutboxRepository
+    stats_repository: repositories.StatsRepository
+    expiry_scheduler: DeadlineScheduler
+    subscription_index: SubscriptionIndex
+    referral_trees: ReferralTreeCache
+
+    async def __call__(
+        self, callback_query: types.CallbackQuery, check_ids: list[int] | None = None, up_to_id: int | None = None
+    ) -> None:
+        if not callback_query.message or not callback_query.bot:
+            return
+        if callback_query.from_user.id != settings.admin_id:
+            return
+
+        user_ids = await self.payment_check_repository.resolve(
+            entities.PaymentCheckStatus.APPROVED, ids=check_ids, up_to_id=up_to_id
+        )
+        # Подписки, которые продление снова активирует, добавляются в счетчики /stats
+        reactivated = await self.subscription_repository.find_inactive_amounts(list(set(user_ids)))
+        # Активация меняет и цены рефереров, поэтому выручку считаем как разницу до и после продления
+        revenue_before = await self.stats_repository.revenue(list(reactivated)) if reactivated else 0
+        # Каждый подтвержденный чек продлевает подписку на месяц
+        end_dates = await self.subscription_repository.extend(
+            {user_id: DAYS_IN_MONTH * count for user_id, count in Counter(user_ids).items()}, now=datetime.now()
+        )
+        # Новые сроки уйдут в панель через outbox, одной транзакцией с продлением
+        await self.outbox_repository.add_many(
+            [
+                entities.OutboxMessage(
+                    idempotency_key=f"extend:{user_id}:{end_date.isoformat()}", user_id=user_id, end_date=end_date
+                )
+                for user_id, end_date in end_dates.items()
+            ]
+        )
+        revenue = await self.stats_repository.revenue(list(reactivated)) if reactivated else 0
+        await self.stats_repository.increment(
+            {
+                entities.StatsCounter.PAYMENTS_APPROVED: len(user_ids),
+                entities.StatsCounter.ACTIVE_SUBSCRIPTIONS: len(reactivated),
+                entities.StatsCounter.MONTHLY_REVENUE: revenue - revenue_before,
+            }
         )
+        await self.uow.commit()
+        # Активированные подписки меняют сводки и скидки их рефереров
+        self.referral_trees.invalidate(reactivated)
 
-        await self.subscription_repository.edit_one(updated_subscription)
+        for user_id, end_date in end_dates.items():
+            self.expiry_scheduler.schedule(user_id, end_date)
+            self.subscription_index.update(user_id, is_active=True, is_notify=True)
+            try:
+                await callback_query.bot.send_message(
+                    user_id, messages.MessageTemplates.PAYMENT_APPROVED.format(end_date=end_date.strftime("%d.%m.%Y"))
+                )
+            except Exception:
+                logger.exception("Ошибка отправки сообщения пользователю %s", user_id)
+
+        if isinstance(callback_query.message, types.Message):
+            await callback_query.message.edit_reply_markup(reply_markup=None)
+        await callback_query.message.answer(
+            messages.CHECKS_APPROVED_MESSAGE.format(count=len(user_ids)), parse_mode=None
+        )
+
+
+@tracing.traced
+@dataclass
+class RejectPaymentCheckUsecase:
+    uow: UnitOfWork
+    payment_check_repository: repositories.PaymentCheckRepository
+
+    async def __call__(self, callback_query: types.CallbackQuery, check_id: int) -> None:
+        if not callback_query.message or not callback_query.bot:
+            return
+        if callback_query.from_user.id != settings.admin_id:
+            return
+
+        user_ids = await self.payment_check_repository.resolve(entities.PaymentCheckStatus.REJECTED, ids=[check_id])
         await self.uow.commit()
 
-        await message.answer(messages.StatusMessages.MESSAGE_SENT_ACCESS_GRANTED)
+        for user_id in user_ids:
+            try:
+                await callback_query.bot.send_message(user_id, messages.StatusMessages.PAYMENT_REJECTED)
+            except Exception:
+                logger.exception("Ошибка отправки сообщения пользователю %s", user_id)
 
+        if isinstance(callback_query.message, types.Message):
+            await callback_query.message.edit_reply_markup(reply_markup=None)
+        await callback_query.message.answer(messages.CHECK_REJECTED_MESSAGE, parse_mode=None)
 
+
+@tracing.traced
 @dataclass
 class DonateUsecase:
     user_repository: repositories.UserRepository
     subscription_repository: repositories.SubscriptionRepository
     referral_repository: repositories.ReferralRepository
+    subscription_index: SubscriptionIndex
+    referral_trees: ReferralTreeCache
 
     async def __call__(self, callback_query: types.CallbackQuery) -> None:
         if not callback_query.message:
             return
-        subscription = await self.subscription_repository.find_one(user_id=callback_query.from_user.id)
+        # Статус и сумма нужны только для текста, так что отставание индекса тут допустимо
+        subscription: SubscriptionState | entities.Subscription | None = self.subscription_index.get(
+            callback_query.from_user.id
+        )
+        if subscription is None:
+            subscription = await self.subscription_repository.find_one(user_id=callback_query.from_user.id)
 
         if subscription.is_active:
             await callback_query.message.answer(messages.StatusMessages.SUBSCRIPTION_ALREADY_ACTIVE)
@@ -317,10 +621,8 @@ class DonateUsecase:
                 ],
             ]
         )
-        count_active_refferal = await self.referral_repository.count_all_active_referral(
-            referrer_id=callback_query.from_user.id
-        )
-        price = int(subscription.amount * (1 - entities.DISCOUNT * count_active_refferal / 100))
+        tree = await _find_referral_tree(self.referral_repository, self.referral_trees, callback_query.from_user.id)
+        price = int(subscription.amount * (1 - entities.DISCOUNT * tree.active_direct / 100))
         await callback_query.message.answer(
             messages.MessageTemplates.PAYMENT_INFO.format(
                 amount=price,
@@ -329,6 +631,7 @@ class DonateUsecase:
         )
 
 
+@tracing.traced
 @dataclass
 class SupportUsecase:
     async def __call__(self, callback_query: types.CallbackQuery, state: FSMContext) -> None:
@@ -339,6 +642,7 @@ class SupportUsecase:
         await state.set_state(messages.FSMStates.WAITING_FOR_SUPPORT_MESSAGE)
 
 
+@tracing.traced
 @dataclass
 class SendCheckUsecase:
     async def __call__(self, callback_query: types.CallbackQuery, state: FSMContext) -> None:
@@ -348,6 +652,7 @@ class SendCheckUsecase:
         await state.set_state(messages.FSMStates.WAITING_FOR_CHECK_MESSAGE)
 
 
+@tracing.traced
 @dataclass
 class SupporMessagetUsecase:
     async def __call__(self, message: types.Message, state: FSMContext) -> None:
@@ -360,9 +665,7 @@ class SupporMessagetUsecase:
         text = message.text or message.caption or messages.Constants.NO_TEXT_PLACEHOLDER
 
         support_message = messages.MessageTemplates.SUPPORT_MESSAGE.format(
-            user_id=message.from_user.id,
-            username=username,
-            text=text
+            user_id=message.from_user.id, username=username, text=text
         )
 
         if message.photo:
@@ -386,11 +689,34 @@ class SupporMessagetUsecase:
         await state.clear()
 
 
+def _parse_audience(args: str | None) -> entities.Audience | None:
+    name, _, argument = (args or "").strip().partition(" ")
+    argument = argument.strip()
+    try:
+        segment = entities.AudienceSegment(name or entities.AudienceSegment.ALL)
+    except ValueError:
+        return None
+    if segment == entities.AudienceSegment.EXPIRING:
+        return entities.Audience(segment, days=int(argument)) if argument.isdigit() else None
+    if segment == entities.AudienceSegment.LANGUAGE:
+        return entities.Audience(segment, language_code=argument.lower()) if argument else None
+    return entities.Audience(segment)
+
+
+def _describe_audience(audience: entities.Audience) -> str:
+    if audience.segment == entities.AudienceSegment.EXPIRING:
+        return f"{audience.segment} {audience.days}"
+    if audience.segment == entities.AudienceSegment.LANGUAGE:
+        return f"{audience.segment} {audience.language_code}"
+    return str(audience.segment)
+
+
+@tracing.traced
 @dataclass
 class BroadcastUsecase:
     user_repository: repositories.UserRepository
 
-    async def __call__(self, message: types.Message, state: FSMContext) -> None:
+    async def __call__(self, message: types.Message, state: FSMContext, args: str | None = None) -> None:
         if not message.from_user:
             return
 
@@ -398,21 +724,31 @@ class BroadcastUsecase:
         if message.from_user.id != settings.admin_id:
             return
 
-        await message.answer(messages.BROADCAST_REQUEST_MESSAGE)
+        audience = _parse_audience(args)
+        if audience is None:
+            await message.answer(messages.BROADCAST_USAGE_MESSAGE, parse_mode=None)
+            return
+
+        await state.update_data(broadcast_audience=asdict(audience))
+        await message.answer(messages.BROADCAST_REQUEST_MESSAGE.format(audience=_describe_audience(audience)))
         await state.set_state(messages.FSMStates.WAITING_FOR_BROADCAST_MESSAGE)
 
 
+@tracing.traced
 @dataclass
 class BroadcastMessageUsecase:
     user_repository: repositories.UserRepository
 
     async def __call__(self, message: types.Message, state: FSMContext) -> None:
-        # Получаем всех пользователей
-        users = await self.user_repository.find_all()
-        user_count = len(users)
+        data = await state.get_data()
+        audience = entities.Audience(**data.get("broadcast_audience", {}))
+        # Один COUNT по тому же условию, по которому потом пойдет рассылка
+        user_count = await self.user_repository.count_audience(audience, now=datetime.now())
 
-        # Сохраняем сообщение в состоянии
-        await state.update_data(broadcast_message=message)
+        # Сообщение не хранится целиком: получателям уходит его копия по id
+        await state.update_data(
+            broadcast_chat_id=message.chat.id, broadcast_message_id=message.message_id, broadcast_count=user_count
+        )
 
         # Создаем клавиатуру подтверждения
         keyboard = InlineKeyboardMarkup(
@@ -432,96 +768,47 @@ class BroadcastMessageUsecase:
 
         # Отправляем подтверждение без markdown парсинга
         await message.answer(
-            messages.BROADCAST_CONFIRMATION_MESSAGE.format(count=user_count),
+            messages.BROADCAST_CONFIRMATION_MESSAGE.format(audience=_describe_audience(audience), count=user_count),
             reply_markup=keyboard,
             parse_mode=None,
         )
 
 
+@tracing.traced
 @dataclass
 class BroadcastConfirmUsecase:
-    user_repository: repositories.UserRepository
+    sender: RateLimitedSender
+    database: ReadDatabase
+    lifecycle: Lifecycle
 
     async def __call__(self, callback_query: types.CallbackQuery, state: FSMContext) -> None:
-        if not callback_query.message or not callback_query.bot:
+        if not callback_query.message:
             return
 
         # Получаем сохраненное сообщение
         data = await state.get_data()
-        broadcast_message = data.get("broadcast_message")
-
-        if not isinstance(broadcast_message, types.Message):
+        await state.clear()
+        if "broadcast_message_id" not in data:
             await callback_query.message.answer("Ошибка: сообщение для рассылки не найдено")
-            await state.clear()
             return
 
-        # Получаем всех пользователей
-        users = await self.user_repository.find_all()
-        sent_count = 0
-
-        # Отправляем сообщение всем пользователям
-        for user in users:
-            try:
-                if broadcast_message.text:
-                    await callback_query.bot.send_message(
-                        chat_id=user.id,
-                        text=broadcast_message.text,
-                        entities=broadcast_message.entities,
-                        parse_mode=None,
-                    )
-                elif broadcast_message.photo:
-                    await callback_query.bot.send_photo(
-                        chat_id=user.id,
-                        photo=broadcast_message.photo[-1].file_id,
-                        caption=broadcast_message.caption,
-                        caption_entities=broadcast_message.caption_entities,
-                        parse_mode=None,
-                    )
-                elif broadcast_message.document:
-                    await callback_query.bot.send_document(
-                        chat_id=user.id,
-                        document=broadcast_message.document.file_id,
-                        caption=broadcast_message.caption,
-                        caption_entities=broadcast_message.caption_entities,
-                        parse_mode=None,
-                    )
-                elif broadcast_message.video:
-                    await callback_query.bot.send_video(
-                        chat_id=user.id,
-                        video=broadcast_message.video.file_id,
-                        caption=broadcast_message.caption,
-                        caption_entities=broadcast_message.caption_entities,
-                        parse_mode=None,
-                    )
-                elif broadcast_message.audio:
-                    await callback_query.bot.send_audio(
-                        chat_id=user.id,
-                        audio=broadcast_message.audio.file_id,
-                        caption=broadcast_message.caption,
-                        caption_entities=broadcast_message.caption_entities,
-                        parse_mode=None,
-                    )
-                elif broadcast_message.voice:
-                    await callback_query.bot.send_voice(
-                        chat_id=user.id,
-                        voice=broadcast_message.voice.file_id,
-                        caption=broadcast_message.caption,
-                        caption_entities=broadcast_message.caption_entities,
-                        parse_mode=None,
-                    )
-                elif broadcast_message.sticker:
-                    await callback_query.bot.send_sticker(
-                        chat_id=user.id,
-                        sticker=broadcast_message.sticker.file_id,
-                    )
-
-                sent_count += 1
-            except Exception as e:
-                # Логируем ошибку, но продолжаем рассылку
-                print(f"Ошибка отправки сообщения пользователю {user.id}: {e}")
-        await state.clear()
+        # Рассылка идет в фоне с общим ограничением скорости, обработчик callback не ждет ее
+        self.lifecycle.spawn(
+            broadcast(
+                self.sender,
+                self.database,
+                self.lifecycle,
+                entities.Audience(**data.get("broadcast_audience", {})),
+                from_chat_id=data["broadcast_chat_id"],
+                message_id=data["broadcast_message_id"],
+                total=data["broadcast_count"],
+            ),
+            "broadcast",
+        )
+        await callback_query.message.answer(messages.BROADCAST_STARTED_MESSAGE, parse_mode=None)
 
 
+@tracing.traced
 @dataclass
 class BroadcastCancelUsecase:
     async def __call__(self, callback_query: types.CallbackQuery, state: FSMContext) -> None:
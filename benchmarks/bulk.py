@@ -0,0 +1,236 @@
+"""Бенчмарк массовых путей: проверка истекших подписок и рассылка.
+
+Засевает N пользователей с подписками и рефералами, затем замеряет
+``check_expired_subscriptions`` и фоновую рассылку ``broadcast`` против локальной
+заглушки Bot API. Рассылка идет по всем пользователям таблицы, поэтому запускать
+только на отдельной базе (``DATABASE_*``) с накатанной схемой.
+
+    uv run python -m benchmarks.bulk --sizes 10000 100000 1000000
+
+Результаты пишутся в ``benchmarks/results/<время>.json``; ``--compare`` выводит
+разницу с предыдущим прогоном.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import subprocess
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+
+from benchmarks.fakes import BOT_ID, FakeBotAPI
+
+USER_ID_OFFSET = 9_000_000_000
+RESULTS_DIR = Path(__file__).parent / "results"
+COPY_BATCH = 50_000
+
+
+class RoundTrips:
+    def __init__(self, engine: AsyncEngine) -> None:
+        self.engine = engine
+        self.count = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args: Any) -> None:
+        self.count += 1
+
+    def close(self) -> None:
+        event.remove(self.engine.sync_engine, "before_cursor_execute", self._on_execute)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss в Linux указывается в килобайтах и только растет за время жизни процесса
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def cleanup(engine: AsyncEngine) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text("DELETE FROM sent_reminders WHERE user_id >= :offset"), {"offset": USER_ID_OFFSET})
+        await conn.execute(text("DELETE FROM payment_checks WHERE user_id >= :offset"), {"offset": USER_ID_OFFSET})
+        await conn.execute(text("DELETE FROM xui_outbox WHERE user_id >= :offset"), {"offset": USER_ID_OFFSET})
+        await conn.execute(text("DELETE FROM client_placements WHERE user_id >= :offset"), {"offset": USER_ID_OFFSET})
+        await conn.execute(text("DELETE FROM referrals WHERE referral_id >= :offset"), {"offset": USER_ID_OFFSET})
+        await conn.execute(text("DELETE FROM subscriptions WHERE user_id >= :offset"), {"offset": USER_ID_OFFSET})
+        await conn.execute(text("DELETE FROM users WHERE id >= :offset"), {"offset": USER_ID_OFFSET})
+
+
+async def seed(engine: AsyncEngine, size: int, expired_ratio: float) -> None:
+    now = datetime.now()
+    rng = random.Random(size)
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        driver = raw.driver_connection
+        assert driver is not None
+        for start in range(0, size, COPY_BATCH):
+            ids = range(USER_ID_OFFSET + start, USER_ID_OFFSET + min(start + COPY_BATCH, size))
+            await driver.copy_records_to_table(
+                "users",
+                records=[(user_id, f"bench{user_id}", "", f"bench{user_id}", "ru") for user_id in ids],
+                columns=["id", "first_name", "last_name", "username", "language_code"],
+            )
+            subscriptions = []
+            for user_id in ids:
+                expired = rng.random() < expired_ratio
+                end_date = now - timedelta(days=1) if expired else now + timedelta(days=rng.randint(1, 30))
+                subscriptions.append((user_id, True, end_date, 300, True))
+            await driver.copy_records_to_table(
+                "subscriptions",
+                records=subscriptions,
+                columns=["user_id", "is_notify", "end_date", "amount", "is_active"],
+            )
+            # Каждый второй пользователь приглашен одним из предыдущих
+            referrals = [
+                (USER_ID_OFFSET + rng.randrange(0, user_id - USER_ID_OFFSET), user_id)
+                for user_id in ids
+                if user_id > USER_ID_OFFSET and user_id % 2 == 0
+            ]
+            await driver.copy_records_to_table(
+                "referrals",
+                records=referrals,
+                columns=["referrer_id", "referral_id"],
+            )
+        await conn.commit()
+
+
+async def measure(name: str, engine: AsyncEngine, bot_api: FakeBotAPI, run: Any) -> dict[str, Any]:
+    round_trips = RoundTrips(engine)
+    sent_before = sum(bot_api.calls.values())
+    started = time.perf_counter()
+    processed = await run()
+    elapsed = time.perf_counter() - started
+    sent = sum(bot_api.calls.values()) - sent_before
+    round_trips.close()
+    result = {
+        "seconds": round(elapsed, 3),
+        "db_round_trips": round_trips.count,
+        "messages": sent,
+        "messages_per_second": round(sent / elapsed, 1) if elapsed else 0.0,
+        "processed": processed,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    print(f"  {name}: {result}")
+    return result
+
+
+async def run_size(size: int, args: argparse.Namespace, engine: AsyncEngine, bot_api: FakeBotAPI) -> dict[str, Any]:
+    from app.adapters.postgresql.database import Database, ReadDatabase
+    from app.adapters.telegram.sender import RateLimitedSender
+    from app.entities import Audience
+    from app.lifecycle import Lifecycle
+    from app.settings import settings
+    from app.tasks.broadcast import broadcast as run_broadcast
+    from app.tasks.subscriptions import check_expired_subscriptions
+
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    # Рассылка сама открывает сессии на каждую страницу получателей
+    database = Database(pg_dsn=str(settings.database_url))
+    read_database = ReadDatabase(primary=database, replica_dsns=[])
+    bot = Bot(token="42:bench", session=AiohttpSession(api=TelegramAPIServer.from_base(bot_api.url)))
+
+    print(f"size={size}")
+    await cleanup(engine)
+    started = time.perf_counter()
+    await seed(engine, size, args.expired_ratio)
+    print(f"  seeded in {time.perf_counter() - started:.1f}s")
+
+    async def sweep() -> int:
+        async with session_factory() as session:
+            sender = RateLimitedSender(bot, messages_per_second=args.messages_per_second)
+            return await check_expired_subscriptions(sender, session)
+
+    async def broadcast() -> int:
+        sender = RateLimitedSender(bot, messages_per_second=args.messages_per_second)
+        await run_broadcast(
+            sender, read_database, Lifecycle(), Audience(), from_chat_id=BOT_ID + 1, message_id=1, total=size
+        )
+        return size
+
+    try:
+        return {
+            "size": size,
+            "sweep": await measure("sweep", engine, bot_api, sweep),
+            "broadcast": await measure("broadcast", database.engine, bot_api, broadcast),
+        }
+    finally:
+        await bot.session.close()
+        await database.close()
+        if not args.keep:
+            await cleanup(engine)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current: dict[str, Any], previous_path: str) -> None:
+    previous = {run["size"]: run for run in json.loads(Path(previous_path).read_text())["runs"]}
+    print(f"compared with {previous_path}:")
+    for run in current["runs"]:
+        before = previous.get(run["size"])
+        if not before:
+            continue
+        for name in ("sweep", "broadcast"):
+            for key in ("seconds", "db_round_trips", "messages_per_second", "peak_rss_mb"):
+                old, new = before[name][key], run[name][key]
+                change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+                print(f"  size={run['size']} {name}.{key}: {old} -> {new} ({change})")
+
+
+async def main(args: argparse.Namespace) -> None:
+    bot_api = FakeBotAPI(latency=args.bot_latency_ms / 1000)
+    await bot_api.start()
+    os.environ.setdefault("BOT_TOKEN", "42:bench")
+
+    from app.settings import settings
+
+    engine = create_async_engine(settings.database_url)
+    try:
+        runs = [await run_size(size, args, engine, bot_api) for size in args.sizes]
+    finally:
+        await engine.dispose()
+        await bot_api.stop()
+
+    result = {
+        "revision": git_revision(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "expired_ratio": args.expired_ratio,
+        "bot_latency_ms": args.bot_latency_ms,
+        "runs": runs,
+    }
+    RESULTS_DIR.mkdir(exist_ok=True)
+    path = RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    path.write_text(json.dumps(result, indent=2))
+    print(f"saved {path}")
+    if args.compare:
+        compare(result, args.compare)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--expired-ratio", type=float, default=0.05, help="доля истекших подписок")
+    parser.add_argument("--bot-latency-ms", type=float, default=0.0)
+    parser.add_argument("--messages-per-second", type=float, default=1_000_000, help="лимит отправок в секунду")
+    parser.add_argument("--keep", action="store_true", help="не удалять засеянные данные")
+    parser.add_argument("--compare", help="JSON предыдущего прогона для сравнения")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main(parse_args()))
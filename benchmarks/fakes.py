@@ -0,0 +1,83 @@
+import asyncio
+import time
+from collections import Counter
+from typing import Any
+
+from aiohttp import web
+
+BOT_ID = 1
+
+
+class FakeServer:
+    """Локальный aiohttp-сервер, имитирующий внешний API с настраиваемой задержкой."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0) -> None:
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self.app = web.Application()
+        self.runner: web.AppRunner | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> None:
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        self.port = self.runner.addresses[0][1]
+
+    async def stop(self) -> None:
+        if self.runner:
+            await self.runner.cleanup()
+
+    async def _delay(self) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+class FakeBotAPI(FakeServer):
+    """Отвечает на методы Bot API так, как это делает Telegram для успешных запросов."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0) -> None:
+        super().__init__(host, port, latency)
+        self.app.router.add_post("/bot{token}/{method}", self.handle)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        await self._delay()
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        data = await request.post()
+        return web.json_response({"ok": True, "result": self.result(method, data)})
+
+    def result(self, method: str, data: Any) -> Any:
+        if method == "getMe":
+            return {"id": BOT_ID, "is_bot": True, "first_name": "bot", "username": "brains_secure_bot"}
+        if method == "copyMessage":
+            return {"message_id": self.calls[method]}
+        if method.startswith("send"):
+            chat_id = int(data.get("chat_id", 0))
+            return {
+                "message_id": self.calls[method],
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+            }
+        return True
+
+
+class FakeXuiPanel(FakeServer):
+    """Имитирует ответы 3x-ui на вход и операции с клиентами инбаунда."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0) -> None:
+        super().__init__(host, port, latency)
+        self.app.router.add_post("/login", self.handle)
+        self.app.router.add_post("/panel/api/inbounds/addClient", self.handle)
+        self.app.router.add_post("/panel/api/inbounds/updateClient/{uuid}", self.handle)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        await self._delay()
+        method = "updateClient" if "uuid" in request.match_info else request.path.rsplit("/", 1)[-1]
+        self.calls[method] += 1
+        return web.json_response({"success": True, "msg": "", "obj": None})
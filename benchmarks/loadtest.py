@@ -0,0 +1,264 @@
+"""Нагрузочный прогон бота: синтетические апдейты подаются прямо в ``dp.feed_update``.
+
+Изменения в панели уходят через outbox, поэтому параллельно апдейтам работает релей
+``relay_outbox``; после сценариев он дочищает очередь, замеряются его проходы и хвост.
+
+Bot API и панель 3x-ui подменяются локальными aiohttp-серверами, база - настоящий
+локальный Postgres из настроек (``DATABASE_*``), схема должна быть накатана.
+
+    uv run python -m benchmarks.loadtest --users 500 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import statistics
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.enums import ParseMode
+from aiogram.types import Update
+from sqlalchemy import text
+
+from benchmarks.fakes import FakeBotAPI, FakeXuiPanel
+
+USER_ID_OFFSET = 7_000_000_000
+# Пауза релея при пустой очереди; в боте ее задает settings.outbox_poll_seconds
+RELAY_POLL_SECONDS = 0.05
+BACKLOG_QUERY = text("SELECT count(*) FROM xui_outbox WHERE delivered_at IS NULL AND user_id >= :first_user_id")
+
+
+class LoadTest:
+    def __init__(self, dp: Dispatcher, bot: Bot, messages: Any) -> None:
+        self.dp = dp
+        self.bot = bot
+        self.messages = messages
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.relay_latencies: list[float] = []
+        self.relay_errors = 0
+        self.relayed = 0
+        self.backlog: list[int] = []
+        self.drain_seconds = 0.0
+
+    def _user(self, user_id: int) -> dict[str, Any]:
+        return {"id": user_id, "is_bot": False, "first_name": f"load{user_id}", "username": f"load{user_id}"}
+
+    def _message(self, user_id: int, **fields: Any) -> dict[str, Any]:
+        return {
+            "message_id": next(self.message_ids),
+            "date": int(datetime.now().timestamp()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+            **fields,
+        }
+
+    def message(self, user_id: int, **fields: Any) -> Update:
+        update = {"update_id": next(self.update_ids), "message": self._message(user_id, **fields)}
+        return Update.model_validate(update, context={"bot": self.bot})
+
+    def callback(self, user_id: int, data: str) -> Update:
+        update = {
+            "update_id": next(self.update_ids),
+            "callback_query": {
+                "id": str(next(self.message_ids)),
+                "from": self._user(user_id),
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": self._message(user_id, text="menu"),
+            },
+        }
+        return Update.model_validate(update, context={"bot": self.bot})
+
+    async def feed(self, label: str, update: Update) -> None:
+        started = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception:
+            self.errors[label] += 1
+        finally:
+            self.latencies[label].append(time.perf_counter() - started)
+
+    async def scenario(self, index: int, user_id: int, referrer_id: int | None) -> None:
+        callback_data = self.messages.CallbackData
+        start = f"/start ref_{referrer_id}" if referrer_id else "/start"
+        await self.feed("/start", self.message(user_id, text=start))
+        await self.feed(callback_data.ACCOUNT, self.callback(user_id, callback_data.ACCOUNT))
+        await self.feed(callback_data.TEAM, self.callback(user_id, callback_data.TEAM))
+        await self.feed(callback_data.DONATE, self.callback(user_id, callback_data.DONATE))
+        # Каждый десятый пользователь отправляет чек об оплате
+        if index % 10 == 0:
+            await self.feed(callback_data.SEND_CHECK, self.callback(user_id, callback_data.SEND_CHECK))
+            photo = [{"file_id": f"check{user_id}", "file_unique_id": f"check{user_id}", "width": 1, "height": 1}]
+            await self.feed("check", self.message(user_id, photo=photo, caption="check"))
+
+    async def relay(
+        self, database: Any, relay_outbox: Any, xui_pool: Any, first_user_id: int, done: asyncio.Event
+    ) -> None:
+        """Гоняет релей outbox, пока идут сценарии, и после них - пока очередь к доставке не опустеет."""
+        drain_started = None
+        while True:
+            claimed = 0
+            started = time.perf_counter()
+            try:
+                async with database.session() as session:
+                    claimed = await relay_outbox(session, xui_pool)
+            except Exception:
+                self.relay_errors += 1
+            self.relay_latencies.append(time.perf_counter() - started)
+            self.relayed += claimed
+
+            async with database.session() as session:
+                backlog = await session.scalar(BACKLOG_QUERY, {"first_user_id": first_user_id})
+            self.backlog.append(backlog or 0)
+
+            if done.is_set():
+                drain_started = drain_started or time.perf_counter()
+                if not claimed:
+                    self.drain_seconds = time.perf_counter() - drain_started
+                    return
+            elif not claimed:
+                await asyncio.sleep(RELAY_POLL_SECONDS)
+
+    async def run(
+        self, users: int, concurrency: int, run_id: int, database: Any, relay_outbox: Any, xui_pool: Any
+    ) -> float:
+        semaphore = asyncio.Semaphore(concurrency)
+        first_user_id = USER_ID_OFFSET + run_id * users
+        done = asyncio.Event()
+        relay_task = asyncio.create_task(self.relay(database, relay_outbox, xui_pool, first_user_id, done))
+
+        async def limited(index: int) -> None:
+            user_id = first_user_id + index
+            # Половина пользователей приходит по реферальной ссылке одного из предыдущих
+            referrer_id = first_user_id + index // 2 if index and index % 2 == 0 else None
+            async with semaphore:
+                await self.scenario(index, user_id, referrer_id)
+
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(limited(index) for index in range(users)))
+        finally:
+            # Пропускная способность считается по апдейтам, дочистка очереди идет в отчет outbox
+            elapsed = time.perf_counter() - started
+            done.set()
+            await relay_task
+        return elapsed
+
+    def report(self, elapsed: float) -> dict[str, Any]:
+        total = sum(len(values) for values in self.latencies.values())
+        handlers = {}
+        for label, values in sorted(self.latencies.items()):
+            handlers[label] = {"count": len(values), "errors": self.errors[label], **percentiles(values)}
+        return {
+            "updates": total,
+            "seconds": round(elapsed, 3),
+            "updates_per_second": round(total / elapsed, 1),
+            "handlers": handlers,
+            "outbox": {
+                "passes": len(self.relay_latencies),
+                "errors": self.relay_errors,
+                "relayed": self.relayed,
+                **percentiles(self.relay_latencies),
+                "peak_backlog": max(self.backlog, default=0),
+                "final_backlog": self.backlog[-1] if self.backlog else 0,
+                "drain_seconds": round(self.drain_seconds, 3),
+            },
+        }
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    quantiles = statistics.quantiles(values, n=100) if len(values) > 1 else values * 99
+    return {
+        "p50_ms": round(quantiles[49] * 1000, 2),
+        "p95_ms": round(quantiles[94] * 1000, 2),
+        "p99_ms": round(quantiles[98] * 1000, 2),
+    }
+
+
+def print_report(report: dict[str, Any]) -> None:
+    print(f"{report['updates']} updates in {report['seconds']}s, {report['updates_per_second']} updates/s")
+    print(f"{'handler':<20}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for label, row in report["handlers"].items():
+        print(
+            f"{label:<20}{row['count']:>8}{row['errors']:>8}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+        )
+    outbox = report["outbox"]
+    print(
+        f"{'outbox relay':<20}{outbox['passes']:>8}{outbox['errors']:>8}"
+        f"{outbox['p50_ms']:>10}{outbox['p95_ms']:>10}{outbox['p99_ms']:>10}"
+    )
+    print(
+        f"outbox: {outbox['relayed']} relayed, peak backlog {outbox['peak_backlog']}, "
+        f"final backlog {outbox['final_backlog']}, drained in {outbox['drain_seconds']}s"
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    bot_api = FakeBotAPI(latency=args.bot_latency_ms / 1000)
+    panel = FakeXuiPanel(latency=args.panel_latency_ms / 1000)
+    await bot_api.start()
+    await panel.start()
+
+    # Настройки читаются при импорте приложения, поэтому адрес панели задаем до него
+    os.environ["XUI_URL_PANEL"] = panel.url
+    os.environ.setdefault("BOT_TOKEN", "42:loadtest")
+
+    from app import messages
+    from app.handlers.main import dp
+    from app.handlers.telegram.deps import get_database, get_xui_pool
+    from app.settings import settings
+    from app.tasks.outbox import relay_outbox
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(bot_api.url))
+    bot = Bot(
+        token=settings.bot_token,
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN_V2),
+    )
+    load_test = LoadTest(dp, bot, messages)
+    xui_pool = get_xui_pool()
+    try:
+        elapsed = await load_test.run(args.users, args.concurrency, args.run_id, get_database(), relay_outbox, xui_pool)
+    finally:
+        await xui_pool.close()
+        await bot.session.close()
+        await bot_api.stop()
+        await panel.stop()
+
+    report = load_test.report(elapsed)
+    report["bot_api_calls"] = dict(bot_api.calls)
+    report["panel_calls"] = dict(panel.calls)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200, help="сколько новых пользователей проходит сценарий")
+    parser.add_argument("--concurrency", type=int, default=20, help="одновременно активных пользователей")
+    parser.add_argument("--run-id", type=int, default=int(time.time()) % 100_000, help="сдвиг диапазона user id")
+    parser.add_argument("--bot-latency-ms", type=float, default=0.0)
+    parser.add_argument("--panel-latency-ms", type=float, default=50.0)
+    parser.add_argument("--json", help="сохранить отчет в JSON")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,60 @@
+"""Бенчмарк холодного старта бота.
+
+Замеряет в отдельных процессах: импорт ``app.handlers.main``, проверку схемы
+``migrate_to_head`` при базе на head и прежний путь ``alembic upgrade head``
+отдельным процессом. Для двух последних нужна база (``DATABASE_*``) с накатанной схемой.
+
+    uv run python -m benchmarks.startup --runs 5
+    uv run python -m benchmarks.startup --skip-database
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+IMPORT_MAIN = "import app.handlers.main"
+CHECK_SCHEMA = """
+import asyncio
+from app.adapters.postgresql.migrations import migrate_to_head
+from app.handlers.telegram.deps import get_database
+asyncio.run(migrate_to_head(get_database()))
+"""
+
+
+def measure(command: list[str], runs: int) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def report(name: str, timings: list[float]) -> None:
+    print(f"{name:<28} median {statistics.median(timings):6.3f}s  min {min(timings):6.3f}s  max {max(timings):6.3f}s")
+
+
+def main(args: argparse.Namespace) -> None:
+    python = [sys.executable]
+    cases = {"python": python + ["-c", "pass"], "import app.handlers.main": python + ["-c", IMPORT_MAIN]}
+    if not args.skip_database:
+        cases["migrate_to_head (at head)"] = python + ["-c", CHECK_SCHEMA]
+        cases["alembic upgrade head"] = python + ["-m", "alembic", "-c", "alembic.ini", "upgrade", "head"]
+
+    for name, command in cases.items():
+        # Первый запуск прогревает байткод и файловый кэш, в замер не идет
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        report(name, measure(command, args.runs))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--skip-database", action="store_true", help="только импорт, без проверки схемы")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_args())